@@ -1,33 +1,78 @@
+import atexit
+from datetime import datetime
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_apscheduler import APScheduler
 from config import Config
+from .utils.db_routing import RoutingSession, REPLICA_BIND, sync_sqlite_replica
+from .utils.startup import StartupProfile
 
-# 初始化扩展
-db = SQLAlchemy()
+# 初始化扩展 (读写分离：只读接口在配置了从库时走从库，见 utils/db_routing.py)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 scheduler = APScheduler()
 
-def create_app():
+def _check_schema():
+    """create_all 不会修改已存在的表：后加的列 / 列类型在这里补齐；需要数据迁移的 (group_id) 给出提示"""
+    from sqlalchemy import inspect
+    try:
+        inspector = inspect(db.engine)
+        columns = {c['name'] for c in inspector.get_columns('fund_assets')}
+        user_columns = {c['name'] for c in inspector.get_columns('users')}
+        user_indexes = {i['name'] for i in inspector.get_indexes('users')}
+        lease_types = {c['name']: str(c['type']).upper() for c in inspector.get_columns('scheduler_leases')}
+    except Exception:
+        return
+    if 'group_id' not in columns:
+        print("⚠️ fund_assets 仍是按分组名存储的旧结构，请先执行: python scripts/migrate_group_ids.py")
+    if 'holdings_version' not in user_columns or 'ix_users_holdings_version' not in user_indexes:
+        # 持仓代次号 (跨进程失效持仓缓存)：新增一列 + 索引即可，旧用户默认 0
+        from sqlalchemy import text
+        try:
+            with db.engine.begin() as conn:
+                if 'holdings_version' not in user_columns:
+                    conn.execute(text("ALTER TABLE users ADD COLUMN holdings_version BIGINT NOT NULL DEFAULT 0"))
+                conn.execute(text("CREATE INDEX ix_users_holdings_version ON users (holdings_version)"))
+            print("✅ users 已新增 holdings_version 列 / 索引")
+        except Exception as e:
+            print(f"⚠️ users.holdings_version 新增失败: {str(e)}")
+    if lease_types.get('expires_at', '').startswith('FLOAT'):
+        # 早期版本建成了单精度 FLOAT (MySQL)：租约表只存临时状态，直接重建
+        from .models import SchedulerLease
+        try:
+            SchedulerLease.__table__.drop(db.engine)
+            SchedulerLease.__table__.create(db.engine)
+            print("✅ scheduler_leases 已重建为双精度时间字段")
+        except Exception as e:
+            print(f"⚠️ scheduler_leases 重建失败: {str(e)}")
+
+def start_scheduler():
+    """启动定时任务线程 (gunicorn preload 时在 fork 之后的 worker 里调用，线程不会跨 fork 保留)"""
+    if not scheduler.running:
+        scheduler.start()
+
+def create_app(start_jobs=True):
     app = Flask(__name__)
     app.config.from_object(Config)
 
     # 1. 初始化数据库
-    db.init_app(app)
+    with StartupProfile.phase('db.init_app'):
+        db.init_app(app)
 
     # 🟢 提示：由于不再使用 JWT，你可以去 config.py 里删掉 JWT_SECRET_KEY 以精简配置
 
     # 2. 注册蓝图 (路由)
-    from .routes.auth import auth_bp
-    from .routes.assets import assets_bp
-    from .routes.ocr import ocr_bp
+    with StartupProfile.phase('import routes'):
+        from .routes.auth import auth_bp
+        from .routes.assets import assets_bp
+        from .routes.ocr import ocr_bp
     
     # 注意：url_prefix 保持一致，前端 request.js 会自动拼接 /api
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(assets_bp, url_prefix='/api/assets')
     app.register_blueprint(ocr_bp, url_prefix='/api/ocr')
 
-    # 3. 同步数据库表结构
-    with app.app_context():
+    # 3. 同步数据库表结构 (只在这里做一次；gunicorn preload 时由 master 执行，worker 不再重复)
+    with app.app_context(), StartupProfile.phase('schema check'):
         try:
             db.create_all()
             # print("✅ 数据库表结构同步/检查完成")
@@ -38,27 +83,157 @@ def create_app():
             else:
                 print(f"❌ 数据库初始化异常: {str(e)}")
                 # 在生产环境下通常不直接 raise，防止容器无限重启，但关键错误建议打印
+        _check_schema()
+        # 本地 SQLite 模拟从库：启动时先同步一次
+        if REPLICA_BIND in app.config.get('SQLALCHEMY_BINDS', {}):
+            sync_sqlite_replica(db)
 
     # 4. 配置定时任务 (APScheduler)
     # 开启 API 支持 (如果需要通过 /scheduler 路径查看任务，请设为 True)
     app.config['SCHEDULER_API_ENABLED'] = False
     
-    # 只有在主进程中启动 Scheduler (防止 Gunicorn 多进程下重复执行任务)
-    # 微信云托管通常单实例运行，如果后续有多实例需求，建议使用 Redis 锁
-    if not scheduler.running:
-        scheduler.init_app(app)
-        scheduler.start()
+    # 先登记任务，start_jobs=False 时 (gunicorn preload) 由 gunicorn.conf.py 在 fork 之后启动
+    scheduler.init_app(app)
+    if start_jobs:
+        start_scheduler()
+
+    # 每个 worker / 实例都会启动 Scheduler：通过数据库租约选出一个 leader，
+    # 抓取类任务开头调用 LeaderLease.claim()，只在 leader 上执行；其余进程从 fund_quotes 同步行情
+    from .services.leader import LeaderLease
+
+    # 🟢 leader 租约心跳 (所有进程)：leader 续期，其他进程在租约过期后接管
+    @scheduler.task('interval', id='leader_heartbeat_job', seconds=Config.LEADER_HEARTBEAT_INTERVAL,
+                    max_instances=1, coalesce=True, next_run_time=datetime.now())
+    def run_leader_heartbeat_job():
+        with app.app_context():
+            LeaderLease.heartbeat()
+
+    def _release_leader():
+        with app.app_context():
+            LeaderLease.release()
+    atexit.register(_release_leader)
     
     # 🟢 每天凌晨 2:00 执行基金数据更新任务
     @scheduler.task('cron', id='update_funds_job', hour=2, minute=0)
     def run_update_job():
         with app.app_context():
+            if not LeaderLease.claim():
+                return
             try:
                 from .services.task_service import TaskService
                 print("⏰ 开始执行定时任务：更新基金 JSON 数据...")
                 TaskService.update_fund_json()
+                TaskService.update_trade_calendar()
                 print("✅ 定时任务执行成功")
             except Exception as e:
                 print(f"❌ 定时任务执行失败: {str(e)}")
 
+    # 🟢 每天凌晨 2:30 增量更新持仓基金的历史净值
+    @scheduler.task('cron', id='update_nav_history_job', hour=2, minute=30)
+    def run_update_nav_history_job():
+        with app.app_context():
+            if not LeaderLease.claim():
+                return
+            try:
+                from .services.task_service import TaskService
+                TaskService.update_nav_history()
+            except Exception as e:
+                print(f"❌ 历史净值更新任务失败: {str(e)}")
+
+    # 🟢 交易时段内定时预取所有持仓基金行情 (请求线程只读快照，不等网络)
+    @scheduler.task('interval', id='refresh_quotes_job', seconds=Config.QUOTE_PREFETCH_INTERVAL,
+                    max_instances=1, coalesce=True)
+    def run_refresh_quotes_job():
+        from .services.trading_calendar import TradingCalendar
+        if not TradingCalendar.is_open():
+            return
+        with app.app_context():
+            if not LeaderLease.claim():
+                return
+            try:
+                from .services.task_service import TaskService
+                TaskService.refresh_held_quotes()
+            except Exception as e:
+                print(f"❌ 行情预取任务失败: {str(e)}")
+
+    # 🟢 非 leader 进程：从 fund_quotes 同步 leader 预取的行情到本进程快照
+    @scheduler.task('interval', id='sync_quotes_job', seconds=Config.QUOTE_SYNC_INTERVAL,
+                    max_instances=1, coalesce=True)
+    def run_sync_quotes_job():
+        from .services.trading_calendar import TradingCalendar
+        if LeaderLease.is_leader() or not TradingCalendar.is_open():
+            return
+        with app.app_context():
+            try:
+                from .services.task_service import TaskService
+                TaskService.sync_quotes_from_store()
+            except Exception as e:
+                print(f"❌ 行情同步任务失败: {str(e)}")
+
+    # 🟢 未配置 Redis 时：所有进程定时同步最近写过持仓的用户的代次号，失效其他进程写入后本进程的持仓缓存
+    if not Config.REDIS_URL:
+        @scheduler.task('interval', id='sync_user_generations_job', seconds=Config.USER_GENERATION_SYNC_INTERVAL,
+                        max_instances=1, coalesce=True)
+        def run_sync_user_generations_job():
+            with app.app_context():
+                try:
+                    from .services.user_cache import UserCache
+                    UserCache.sync_generations()
+                except Exception as e:
+                    print(f"❌ 持仓代次号同步失败: {str(e)}")
+
+    # 🟢 每小时清理 OCR 任务：执行进程已退出的标记失败，过期记录删除
+    @scheduler.task('interval', id='purge_ocr_jobs_job', hours=1, max_instances=1, coalesce=True)
+    def run_purge_ocr_jobs_job():
+        with app.app_context():
+            if not LeaderLease.claim():
+                return
+            try:
+                from .services.ocr_jobs import OcrJobService
+                stale, deleted = OcrJobService.purge()
+                if stale or deleted:
+                    print(f"🧹 OCR 任务清理：{stale} 个超时，{deleted} 个过期")
+            except Exception as e:
+                print(f"❌ OCR 任务清理失败: {str(e)}")
+
+    # 🟢 所有进程：已发布的基金目录 / 交易日历版本比本地新时下载替换 (其他实例 / 新启动的容器都能拿到最新版本)
+    @scheduler.task('interval', id='sync_catalog_job', seconds=Config.FUND_CATALOG_SYNC_INTERVAL,
+                    max_instances=1, coalesce=True, next_run_time=datetime.now())
+    def run_sync_catalog_job():
+        with app.app_context():
+            try:
+                from .services.catalog_release import CatalogRelease
+                CatalogRelease.sync()
+            except Exception as e:
+                print(f"❌ 基金目录同步失败: {str(e)}")
+            try:
+                from .services.trading_calendar import TradingCalendar
+                TradingCalendar.sync()
+            except Exception as e:
+                print(f"❌ 交易日历同步失败: {str(e)}")
+
+    # 🟢 行情 write-behind：定时把内存缓冲区里的最新行情批量写入 fund_quotes
+    @scheduler.task('interval', id='flush_quotes_job', seconds=Config.QUOTE_STORE_FLUSH_INTERVAL,
+                    max_instances=1, coalesce=True)
+    def run_flush_quotes_job():
+        with app.app_context():
+            try:
+                from .services.quote_store import QuoteStore
+                QuoteStore.flush()
+            except Exception as e:
+                print(f"❌ 行情落库任务失败: {str(e)}")
+
+    # 🟢 本地 SQLite 模拟从库：定时从主库整库复制 (云端 MySQL 从库由数据库自身复制，不注册)
+    if REPLICA_BIND in app.config.get('SQLALCHEMY_BINDS', {}) and app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        @scheduler.task('interval', id='sync_replica_job', seconds=Config.DB_REPLICA_SYNC_INTERVAL,
+                        max_instances=1, coalesce=True)
+        def run_sync_replica_job():
+            with app.app_context():
+                if not LeaderLease.claim():
+                    return
+                try:
+                    sync_sqlite_replica(db)
+                except Exception as e:
+                    print(f"❌ 从库同步失败: {str(e)}")
+
     return app
\ No newline at end of file
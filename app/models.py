@@ -1,11 +1,14 @@
+import json
 from . import db
-from datetime import datetime
+from datetime import datetime, timezone
 
 class User(db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
     openid = db.Column(db.String(128), unique=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # 持仓代次号 (最近一次持仓写入的纳秒时间戳)：未配置 Redis 时各进程靠它判断持仓缓存是否失效
+    holdings_version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0', index=True)
 
 class FundGroup(db.Model):
     """
@@ -44,10 +47,115 @@ class FundAsset(db.Model):
     fund_key = db.Column(db.String(50))              # 🚀 蚂蚁基金唯一 ID (e.g., '1.002207')
 
     
-    # 🟢 彻底抛弃 platform，改用 group_name
-    group_name = db.Column(db.String(32), default='默认账户', nullable=False) 
+    # 🟢 所属分组 (fund_groups.id)：重命名分组只改一行，删除/移动按索引定位
+    group_id = db.Column(db.Integer, db.ForeignKey('fund_groups.id'), nullable=False)
+    group = db.relationship('FundGroup')
 
     # 🟢 索引同步更新
     __table_args__ = (
-        db.UniqueConstraint('user_id', 'fund_code', 'group_name', name='uix_user_fund_group'),
-    )
\ No newline at end of file
+        db.UniqueConstraint('group_id', 'fund_code', name='uix_group_fund'),
+        db.Index('ix_fund_assets_user_group', 'user_id', 'group_id'),
+    )
+
+    @property
+    def group_name(self):
+        return self.group.name if self.group else None
+
+class FundQuote(db.Model):
+    """
+    每只基金最近一次抓取成功的行情 (每个代码一行)
+    上游失败 / 休市时批量读取兜底，替代全 0 的 error_fallback
+    """
+    __tablename__ = 'fund_quotes'
+    code = db.Column(db.String(10), primary_key=True)
+    name = db.Column(db.String(128))
+    nav = db.Column(db.Float)
+    gsz = db.Column(db.Float)
+    gszzl = db.Column(db.Float)
+    gztime = db.Column(db.String(32))
+    source = db.Column(db.String(16))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_quote(self):
+        return {
+            "code": self.code,
+            "name": self.name,
+            "nav": self.nav,
+            "gsz": self.gsz,
+            "gszzl": self.gszzl,
+            "gztime": self.gztime or '--:--',
+            "source": "persisted",
+            "updated_at": self.updated_at.strftime("%Y-%m-%d %H:%M:%S") if self.updated_at else None,
+            # 抓取时间戳 (updated_at 为 UTC)
+            "_ts": self.updated_at.replace(tzinfo=timezone.utc).timestamp() if self.updated_at else 0
+        }
+
+
+class FundNavHistory(db.Model):
+    """
+    基金历史净值：每个代码一行，日期与净值序列打包成 NumPy 数组的二进制存储
+    dates: int32 (距 1970-01-01 的天数，升序) | navs: float64 单位净值
+    """
+    __tablename__ = 'fund_nav_history'
+    code = db.Column(db.String(10), primary_key=True)
+    dates = db.Column(db.LargeBinary(length=2 ** 24), nullable=False)
+    navs = db.Column(db.LargeBinary(length=2 ** 24), nullable=False)
+    count = db.Column(db.Integer, default=0)
+    last_date = db.Column(db.Date)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SchedulerLease(db.Model):
+    """
+    定时任务 leader 租约 (每个 name 一行)
+    持有者定期续期；过期未续 (进程退出/卡死) 后由其他进程接管
+    """
+    __tablename__ = 'scheduler_leases'
+    name = db.Column(db.String(32), primary_key=True)
+    holder = db.Column(db.String(128))      # 主机名:pid
+    # 双精度：MySQL 的 FLOAT 是单精度，epoch 秒只能精确到 128s，租约会被提前抢占
+    expires_at = db.Column(db.Double, default=0)   # 租约到期时间 (epoch 秒)
+    heartbeat_at = db.Column(db.Double, default=0)
+
+
+class FundCatalogRelease(db.Model):
+    """
+    已发布的数据文件 (每个 name 一行，只保留最新版本)
+    - funds: 基金名称-代码表，各实例落后时下载 payload 重建本地 funds.json / funds.catalog
+    - trade_dates: 交易日历，各实例落后时下载 payload 重写本地 trade_dates.json
+    """
+    __tablename__ = 'fund_catalog_releases'
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False)   # 发布时间毫秒，与 funds.catalog 文件头一致
+    count = db.Column(db.Integer, default=0)
+    payload = db.Column(db.LargeBinary(length=2 ** 24), nullable=False)   # zlib 压缩的 JSON
+    published_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class OcrJob(db.Model):
+    """
+    截图识别任务：提交后立即返回 id，由后台线程池执行，客户端轮询状态
+    存数据库而不是进程内存：轮询请求可能落到其他 worker / 实例
+    """
+    __tablename__ = 'ocr_jobs'
+    id = db.Column(db.String(32), primary_key=True)         # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    file_id = db.Column(db.String(512), nullable=False)
+    status = db.Column(db.String(16), default='queued')      # queued / running / done / failed
+    stage = db.Column(db.String(16))                          # 当前阶段：token / download / ocr / parse
+    result = db.Column(db.Text)                               # 识别结果 JSON
+    error = db.Column(db.String(255))
+    timings = db.Column(db.Text)                              # 各阶段耗时 JSON (毫秒)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "list": json.loads(self.result) if self.result else None,
+            "error": self.error,
+            "timings": json.loads(self.timings) if self.timings else {},
+            "created_at": self.created_at.strftime("%Y-%m-%d %H:%M:%S") if self.created_at else None,
+        }
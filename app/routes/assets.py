@@ -1,6 +1,19 @@
-from flask import Blueprint, request, jsonify
-from ..models import db, FundAsset, FundGroup, User
+from flask import Blueprint, request, jsonify, Response, current_app, stream_with_context
+from ..models import db, FundAsset, FundGroup
 from ..services.market import MarketService
+from ..services.history import NavHistoryService
+from ..services.valuation import ValuationEngine
+from ..services.user_cache import UserCache
+from ..services.identity import get_current_user_id
+from ..services.holdings import HoldingsService
+from ..services.leader import LeaderLease
+from ..services.catalog_release import CatalogRelease
+from ..utils.db_routing import read_only
+from datetime import date, timedelta
+import threading
+import json
+import time
+import zlib
 import traceback
 
 assets_bp = Blueprint('assets', __name__)
@@ -9,142 +22,273 @@ assets_bp = Blueprint('assets', __name__)
 DEFAULT_GROUP_NAME = '默认账户'
 ALL_GROUP_NAME = '全部'
 
-# ==========================================
-# 🛡️ 辅助函数：通过微信 Header 获取用户 ID
-# ==========================================
-def get_current_user_id():
-    """
-    通过云托管注入的 x-wx-openid 识别用户
-    依靠 SQLALCHEMY_ENGINE_OPTIONS 中的 pool_pre_ping 自动重连 MySQL
-    """
-    openid = request.headers.get('x-wx-openid')
-    if not openid:
-        return 1 # 本地调试默认用户
-    
-    user = User.query.filter_by(openid=openid).first()
-    if not user:
-        try:
-            user = User(openid=openid)
-            db.session.add(user)
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
-            user = User.query.filter_by(openid=openid).first()
-    return user.id
+# SSE 推送连接计数 (进程内)
+_active_streams = 0
+_stream_lock = threading.Lock()
+
+# 首页分组汇总缓存：持仓变动时失效，行情版本变化时重算
+_summary_cache = UserCache('summary', ttl=30)
+
+def _invalidate_user_cache(user_id):
+    """持仓/分组写操作提交后调用，清掉该用户的派生缓存"""
+    UserCache.invalidate(user_id)
+
+def _ensure_group(user_id, name):
+    """按名称取分组，不存在时新建 (flush 拿到 id，不提交)"""
+    group = FundGroup.query.filter_by(user_id=user_id, name=name).first()
+    if not group:
+        group = FundGroup(user_id=user_id, name=name, sort_order=0 if name == DEFAULT_GROUP_NAME else 99)
+        db.session.add(group)
+        db.session.flush()
+    return group
 
 # ==========================================
 # 📈 行情与列表接口 (核心)
 # ==========================================
 
 @assets_bp.route('/list', methods=['GET'])
+@read_only
 def list_assets():
     user_id = get_current_user_id()
-    user_assets = FundAsset.query.filter_by(user_id=user_id).all()
+    user_assets = HoldingsService.get(user_id)
     
     # 1. 现在只需传入 code 列表
     codes = [a.fund_code for a in user_assets]
     quotes = MarketService.batch_get_valuation(codes) if codes else {}
     
-    results = []
-    for asset in user_assets:
-        quote = quotes.get(asset.fund_code) or {} # 🚀 保证 quote 不为 None
-        
-        shares = float(asset.holding_shares or 0)
-        db_cost = float(asset.cost_price or 1.0)
-        
-        # 🚀 优先级：接口净值 > 接口估值 > 数据库成本价
-        yest_nav = float(quote.get('nav') or quote.get('gsz') or db_cost)
-        curr_gsz = float(quote.get('gsz') or yest_nav)
-        gszzl = float(quote.get('gszzl') or 0.0)
-
-        mv = shares * curr_gsz
-        dp = (shares * yest_nav) * (gszzl / 100)
-        tp = mv - (shares * db_cost)
+    # 2. 🧮 统一估值引擎批量计算 (兜底规则见 ValuationEngine)
+    values = ValuationEngine.value_positions(user_assets, quotes)
 
+    results = []
+    for asset, v in zip(user_assets, values):
         results.append({
             "id": asset.id,
             "fund_code": asset.fund_code,
             "fund_name": asset.fund_name,
             "group_name": asset.group_name or '默认账户',
-            "holding_shares": round(shares, 4),
-            "nav": round(yest_nav, 4),
-            "gsz": round(curr_gsz, 4),
-            "daily_pct": round(gszzl, 2), 
-            "market_value": round(mv, 2),
-            "day_profit": round(dp, 2),
-            "total_profit": round(tp, 2)
+            "holding_shares": round(float(asset.holding_shares or 0), 4),
+            "nav": v["nav"],
+            "gsz": v["gsz"],
+            "daily_pct": v["gszzl"], 
+            "market_value": v["market_value"],
+            "day_profit": v["day_profit"],
+            "total_profit": v["total_profit"],
+            "yield_rate": v["yield_rate"]
         })
 
-    return jsonify({"funds": results})
+    # 🏷️ ETag：内容没变时返回 304，弱网下省掉整包下载
+    resp = jsonify({"funds": results})
+    resp.add_etag()
+    return resp.make_conditional(request)
+
+@assets_bp.route('/summary', methods=['GET'])
+@read_only
+def get_summary():
+    """
+    📊 首页汇总：各分组及「全部」的市值、当日收益、总收益
+    一次估值 + 分组求和，客户端不必再下载全部持仓自行累加
+    """
+    user_id = get_current_user_id()
+    feed = MarketService.quote_feed()
+    cached = _summary_cache.get(user_id)
+    if cached and cached[0] == feed.version:
+        return jsonify(cached[1])
+
+    version = feed.version
+    user_assets = HoldingsService.get(user_id)
+    group_names = [g.name for g in FundGroup.query.filter_by(user_id=user_id).order_by(FundGroup.sort_order).all()]
+    for a in user_assets:
+        if (a.group_name or DEFAULT_GROUP_NAME) not in group_names:
+            group_names.append(a.group_name or DEFAULT_GROUP_NAME)
+
+    # 下标 0 为「全部」，每条持仓同时计入「全部」与所属分组
+    slots = {name: i + 1 for i, name in enumerate(group_names)}
+    positions = list(user_assets) * 2
+    group_index = [0] * len(user_assets) + [slots[a.group_name or DEFAULT_GROUP_NAME] for a in user_assets]
+
+    codes = [a.fund_code for a in user_assets]
+    quotes = MarketService.batch_get_valuation(codes) if codes else {}
+    sums = ValuationEngine.aggregate(
+        group_index, len(group_names) + 1,
+        [p.fund_code for p in positions],
+        [p.holding_shares for p in positions],
+        [p.cost_price for p in positions],
+        quotes,
+    )
+    payload = {"groups": [{"group_name": name, **v} for name, v in zip([ALL_GROUP_NAME] + group_names, sums)]}
+    _summary_cache.set(user_id, (version, payload))
+    return jsonify(payload)
+
+def _format_quotes(codes, raw_quotes, asset_map):
+    """把原始行情与持仓合成 /quotes 的返回结构 {code: {...}} (未持有的代码份额按 0 计算)"""
+    assets = [asset_map.get(code) for code in codes]
+    values = ValuationEngine.rows(
+        codes,
+        [a.holding_shares if a else 0 for a in assets],
+        [a.cost_price if a else None for a in assets],
+        raw_quotes,
+    )
+    formatted = {}
+    for code, v in zip(codes, values):
+        v["source"] = (raw_quotes.get(code) or {}).get("source", "unknown")
+        formatted[code] = v
+    return formatted
 
 @assets_bp.route('/quotes', methods=['POST'])
+@read_only
 def get_realtime_quotes():
     user_id = get_current_user_id()
     data = request.get_json()
     codes = data.get('codes', [])
     
-    user_assets = FundAsset.query.filter_by(user_id=user_id).all()
-    asset_map = {a.fund_code: a for a in user_assets}
+    asset_map = {a.fund_code: a for a in HoldingsService.get(user_id)}
     
     # 🚀 MarketService 内部已实现 is_exchange_traded 分流
     raw_quotes = MarketService.batch_get_valuation(codes)
-    
-    formatted_quotes = {}
-    for code in codes:
-        # 1. 拿取行情，如果该代码抓取失败，给一个空字典兜底
-        q = raw_quotes.get(code) or {}
-        asset = asset_map.get(code)
-        
-        # 2. 🚀 关键改进：多级保底提取价格
-        # 场内基金接口通常返回 gsz(当前价) 和 nav(昨收)
-        # 只要其中一个有值，就不能让另一个为 0
-        raw_nav = float(q.get("nav") or 0)
-        raw_gsz = float(q.get("gsz") or 0)
-        
-        # 如果 nav 是 0（比如新浪接口异常），尝试用 gsz 或数据库里的成本价顶替
-        nav = raw_nav if raw_nav > 0 else (raw_gsz if raw_gsz > 0 else float(asset.cost_price or 1.0))
-        # 如果 gsz 是 0（比如非交易时段），估值就等于净值
-        gsz = raw_gsz if raw_gsz > 0 else nav
-        
-        pct = float(q.get("gszzl") or 0.0)
-        
-        res = {
-            "nav": round(nav, 4),
-            "gsz": round(gsz, 4),
-            "gszzl": round(pct, 2),
-            "market_value": 0,
-            "day_profit": 0,
-            "total_profit": 0,
-            "source": q.get("source", "unknown")
-        }
-
-        # 3. 核心财务计算
-        if asset:
-            shares = float(asset.holding_shares or 0)
-            cost = float(asset.cost_price or nav)
-            
-            # 市值 = 份额 * 当前估值(或现价)
-            mv = shares * gsz
-            # 当日收益 = (份额 * 昨日净值) * 当日涨跌幅
-            # 对于场内基金，这等同于 (持仓数量 * 昨收价) * 涨幅
-            dp = (shares * nav) * (pct / 100)
-            # 总收益 = 当前总市值 - 总本金
-            tp = mv - (shares * cost)
-            
-            res.update({
-                "market_value": round(mv, 2),
-                "day_profit": round(dp, 2),
-                "total_profit": round(tp, 2)
-            })
-            
-        formatted_quotes[code] = res
-
-    return jsonify(formatted_quotes)
+
+    # 🔁 增量模式：客户端带上次拿到的 version，只返回之后有变化的代码
+    # version = "持仓指纹.代码:内容哈希,..."，只取决于返回内容本身，轮询落到哪个 worker 结果都一样
+    # 持仓变了 (加仓/删除等) 就全量返回
+    formatted = _format_quotes(codes, raw_quotes, asset_map)
+    holdings = _holdings_fingerprint(asset_map)
+    hashes = {code: f"{zlib.crc32(json.dumps(v, sort_keys=True).encode()):08x}" for code, v in formatted.items()}
+    version = f"{holdings}." + ",".join(f"{code}:{h}" for code, h in sorted(hashes.items()))
+    since = data.get('since')
+    if since is not None:
+        since_holdings, _, since_hashes = str(since).partition('.')
+        if since_holdings == holdings:
+            seen = dict(item.split(':', 1) for item in since_hashes.split(',') if ':' in item)
+            formatted = {code: v for code, v in formatted.items() if seen.get(code) != hashes[code]}
+        return jsonify({"version": version, "unchanged": not formatted, "quotes": formatted})
+
+    resp = jsonify(formatted)
+    resp.headers['X-Quote-Version'] = version
+    return resp
+
+def _holdings_fingerprint(asset_map):
+    """持仓指纹：份额或成本变化时改变"""
+    items = sorted((code, a.holding_shares or 0, a.cost_price or 0) for code, a in asset_map.items())
+    return f"{zlib.crc32(repr(items).encode()):08x}"
+
+@assets_bp.route('/stream', methods=['GET'])
+@read_only
+def stream_quotes():
+    """
+    📡 SSE 实时估值推送：由后台预取任务的行情更新驱动，只推送用户持仓中有变化的基金
+    - 首条 snapshot 事件推送全部持仓，之后 quotes 事件只推送变化的部分
+    - 每条连接占用一个 gunicorn 线程，所以限制并发连接数与单次连接时长，到时客户端按 retry 自动重连
+    """
+    global _active_streams
+    user_id = get_current_user_id()
+    # 持仓缓存里是普通元组，推送期间不占用数据库连接
+    positions = HoldingsService.get(user_id)
+    db.session.remove()
+    codes = list(dict.fromkeys(p.fund_code for p in positions))
+
+    with _stream_lock:
+        if _active_streams >= current_app.config['SSE_MAX_STREAMS']:
+            return jsonify({"msg": "推送连接已满，请改用轮询"}), 503
+        _active_streams += 1
+
+    feed = MarketService.quote_feed()
+
+    def _event(name, quotes):
+        changed = [p for p in positions if p.fund_code in quotes]
+        items = [{"id": p.id, "fund_code": p.fund_code, "source": quotes[p.fund_code].get("source", "unknown"), **v}
+                 for p, v in zip(changed, ValuationEngine.value_positions(changed, quotes))]
+        return f"event: {name}\ndata: {json.dumps(items, ensure_ascii=False)}\n\n"
+
+    def generate():
+        deadline = time.time() + current_app.config['SSE_MAX_DURATION']
+        version = feed.version
+        yield f"retry: {current_app.config['SSE_RETRY_MS']}\n\n"
+        snapshot = MarketService.batch_get_valuation(codes) if codes else {}
+        # 首条快照可能经 _last_known 读过 fund_quotes：先归还连接再推送，之后的循环只读进程内快照
+        db.session.remove()
+        yield _event("snapshot", snapshot)
+        while time.time() < deadline:
+            latest = feed.wait_for_update(version, timeout=current_app.config['SSE_KEEPALIVE'])
+            if latest == version:
+                yield ": keepalive\n\n"
+                continue
+            changed = feed.changed_since(codes, version)
+            version = latest
+            if changed:
+                yield _event("quotes", changed)
+
+    def release():
+        global _active_streams
+        with _stream_lock:
+            _active_streams -= 1
+
+    resp = Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # 无论正常结束还是客户端断开，WSGI 关闭响应时都会回调
+    resp.call_on_close(release)
+    return resp
+
+@assets_bp.route('/history/<code>', methods=['GET'])
+@read_only
+def get_nav_history(code):
+    """
+    历史净值区间查询 (本地库，不请求上游)
+    参数：days=最近 N 天 或 start/end=YYYY-MM-DD
+    """
+    try:
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else None
+        if request.args.get('start'):
+            start = date.fromisoformat(request.args['start'])
+        else:
+            days = int(request.args.get('days', 90))
+            start = (end or date.today()) - timedelta(days=days)
+    except ValueError:
+        return jsonify({"msg": "日期参数格式错误"}), 400
+
+    return jsonify({
+        "code": code,
+        "points": NavHistoryService.get_points(code, start, end),
+        "period_return": NavHistoryService.period_return(code, start, end)
+    })
+
+@assets_bp.route('/quotes/stats', methods=['GET'])
+def get_quote_cache_stats():
+    """行情缓存命中/未命中计数，用于评估缓存容量；leader 为本进程的定时任务租约状态，catalog 为基金目录版本"""
+    return jsonify({**MarketService.cache_stats(), "leader": LeaderLease.status(), "catalog": CatalogRelease.status()})
 
 # ==========================================
 # ➕ 资产添加与移动
 # ==========================================
 
+def _merge_position(asset, user_id, code, group, fund_name, current_nav, input_value, input_profit):
+    """
+    按“当前市值 + 持有收益”折算份额与成本，合并进已有持仓或新建持仓 (不提交)
+    返回 (持仓对象, 本次新增份额)
+    """
+    shares = round(input_value / current_nav, 4)
+    cost_total = input_value - input_profit
+    avg_cost_price = cost_total / shares if shares > 0 else current_nav
+
+    if asset:
+        old_shares = float(asset.holding_shares or 0)
+        old_cost_price = float(asset.cost_price or current_nav)
+        new_total_shares = old_shares + shares
+        if new_total_shares > 0:
+            asset.cost_price = (old_shares * old_cost_price + cost_total) / new_total_shares
+            asset.holding_shares = new_total_shares
+        asset.fund_name = fund_name
+    else:
+        asset = FundAsset(
+            user_id=user_id, 
+            fund_code=code, 
+            fund_name=fund_name,
+            holding_shares=shares, 
+            cost_price=avg_cost_price,
+            group_id=group.id,
+            fund_key=None # 🚀 彻底弃用这个字段
+        )
+        db.session.add(asset)
+    return asset, shares
+
 @assets_bp.route('/add', methods=['POST'])
 def add_asset():
     user_id = get_current_user_id()
@@ -153,7 +297,7 @@ def add_asset():
     target_group = data.get('group_name') or "默认账户"
 
     # 🚀 使用双链路逻辑获取详情
-    fund_info = MarketService.get_single_quote(code)
+    _, fund_info = MarketService.get_single_quote(code)
     
     if not fund_info:
         return jsonify({"msg": "无法获取该基金详情，请检查代码是否正确"}), 404
@@ -168,41 +312,69 @@ def add_asset():
     except (ValueError, TypeError):
         return jsonify({"msg": "金额格式错误"}), 400
 
-    # 计算逻辑保持不变
-    shares = round(input_value / current_nav, 4)
-    cost_total = input_value - input_profit
-    avg_cost_price = cost_total / shares if shares > 0 else current_nav
-
-    # 3. 合并或新建逻辑
-    asset = FundAsset.query.filter_by(user_id=user_id, fund_code=code, group_name=target_group).first()
-    
     try:
-        if asset:
-            old_shares = float(asset.holding_shares or 0)
-            old_cost_price = float(asset.cost_price or current_nav)
-            new_total_shares = old_shares + shares
-            if new_total_shares > 0:
-                asset.cost_price = (old_shares * old_cost_price + cost_total) / new_total_shares
-                asset.holding_shares = new_total_shares
-            asset.fund_name = fund_name
-        else:
-            new_asset = FundAsset(
-                user_id=user_id, 
-                fund_code=code, 
-                fund_name=fund_name,
-                holding_shares=shares, 
-                cost_price=avg_cost_price,
-                group_name=target_group,
-                fund_key=None # 🚀 彻底弃用这个字段
-            )
-            db.session.add(new_asset)
-        
+        # 合并或新建逻辑
+        group = _ensure_group(user_id, target_group)
+        asset = FundAsset.query.filter_by(group_id=group.id, fund_code=code).first()
+        _, shares = _merge_position(asset, user_id, code, group, fund_name,
+                                    current_nav, input_value, input_profit)
         db.session.commit()
+        _invalidate_user_cache(user_id)
         return jsonify({"msg": f"【{fund_name}】保存成功", "shares": shares}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({"msg": f"保存失败: {str(e)}"}), 500
 
+@assets_bp.route('/add/batch', methods=['POST'])
+def add_assets_batch():
+    """
+    📥 批量导入 (OCR 识别结果一次性入库)
+    参数：list=[{fund_code, amount, profit, fund_name?}]，group_name=目标分组
+    行情走批量接口，已有持仓一次 IN 查询取出，全部合并后只提交一次
+    """
+    user_id = get_current_user_id()
+    data = request.get_json() or {}
+    target_group = data.get('group_name') or "默认账户"
+
+    items, failed = [], []
+    for item in data.get('list') or []:
+        code = str(item.get('fund_code') or '').strip()
+        try:
+            items.append((code, float(item.get('amount') or 0), float(item.get('profit') or 0), item.get('fund_name')))
+        except (ValueError, TypeError):
+            failed.append({"fund_code": code, "msg": "金额格式错误"})
+    if not items:
+        return jsonify({"msg": "没有可导入的基金", "imported": [], "failed": failed}), 400
+
+    codes = list(dict.fromkeys(code for code, *_ in items))
+    quotes = MarketService.batch_get_valuation(codes)
+
+    imported = []
+    try:
+        group = _ensure_group(user_id, target_group)
+        existing = {a.fund_code: a for a in FundAsset.query.filter(
+            FundAsset.group_id == group.id,
+            FundAsset.fund_code.in_(codes)
+        ).all()}
+        for code, input_value, input_profit, ocr_name in items:
+            fund_info = quotes.get(code)
+            if not fund_info:
+                failed.append({"fund_code": code, "msg": "无法获取该基金详情"})
+                continue
+            fund_name = fund_info.get('name') or ocr_name or code
+            current_nav = float(fund_info.get('nav') or 1.0)
+            # 同一代码在列表里出现多次时，后面的合并进前面刚建的持仓
+            existing[code], shares = _merge_position(existing.get(code), user_id, code, group,
+                                                     fund_name, current_nav, input_value, input_profit)
+            imported.append({"fund_code": code, "fund_name": fund_name, "shares": shares})
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"msg": f"保存失败: {str(e)}"}), 500
+
+    _invalidate_user_cache(user_id)
+    return jsonify({"msg": f"成功导入 {len(imported)} 只基金", "imported": imported, "failed": failed}), 201
+
 @assets_bp.route('/move', methods=['POST'])
 def move_asset():
     """移动资产到其他分组"""
@@ -210,11 +382,13 @@ def move_asset():
     data = request.get_json()
     code, from_g, to_g = data.get('fund_code'), data.get('from_group'), data.get('group_name')
     
-    src = FundAsset.query.filter_by(user_id=user_id, fund_code=code, group_name=from_g).first()
-    dest = FundAsset.query.filter_by(user_id=user_id, fund_code=code, group_name=to_g).first()
+    src_group = FundGroup.query.filter_by(user_id=user_id, name=from_g).first()
+    src = FundAsset.query.filter_by(group_id=src_group.id, fund_code=code).first() if src_group else None
     
     try:
-        if dest and src:
+        dest_group = _ensure_group(user_id, to_g)
+        dest = FundAsset.query.filter_by(group_id=dest_group.id, fund_code=code).first()
+        if dest and src and dest is not src:
             # 目标组已有，进行合并
             old_cost_total = dest.holding_shares * dest.cost_price + src.holding_shares * src.cost_price
             dest.holding_shares += src.holding_shares
@@ -222,8 +396,9 @@ def move_asset():
                 dest.cost_price = old_cost_total / dest.holding_shares
             db.session.delete(src)
         elif src:
-            src.group_name = to_g
+            src.group_id = dest_group.id
         db.session.commit()
+        _invalidate_user_cache(user_id)
         return jsonify({"msg": "移动成功"}), 200
     except Exception as e:
         db.session.rollback()
@@ -234,6 +409,7 @@ def move_asset():
 # ==========================================
 
 @assets_bp.route('/groups', methods=['GET'])
+@read_only
 def get_groups():
     user_id = get_current_user_id()
     db_groups = FundGroup.query.filter_by(user_id=user_id).order_by(FundGroup.sort_order).all()
@@ -244,9 +420,11 @@ def get_groups():
         db.session.add(default_group)
         try:
             db.session.commit()
-            group_names.insert(0, DEFAULT_GROUP_NAME)
+            _invalidate_user_cache(user_id)
         except Exception:
+            # 多半是并发请求已经建好 (或从库尚未同步到)，照常返回默认分组
             db.session.rollback()
+        group_names.insert(0, DEFAULT_GROUP_NAME)
 
     return jsonify({"groups": [ALL_GROUP_NAME] + group_names})
 
@@ -262,6 +440,7 @@ def add_group():
     new_g = FundGroup(user_id=user_id, name=name, sort_order=99)
     db.session.add(new_g)
     db.session.commit()
+    _invalidate_user_cache(user_id)
     return jsonify({"msg": "成功"}), 201
 
 @assets_bp.route('/groups/rename', methods=['POST'])
@@ -272,9 +451,10 @@ def rename_group():
     group = FundGroup.query.filter_by(user_id=user_id, name=old).first()
     if not group: return jsonify({"msg": "未找到"}), 404
     
+    # 持仓通过 group_id 引用分组，只需改分组这一行
     group.name = new
-    FundAsset.query.filter_by(user_id=user_id, group_name=old).update({"group_name": new})
     db.session.commit()
+    _invalidate_user_cache(user_id)
     return jsonify({"msg": "已重命名"}), 200
 
 @assets_bp.route('/groups/delete', methods=['POST'])
@@ -283,9 +463,12 @@ def delete_group():
     name = request.get_json().get('name')
     if name == DEFAULT_GROUP_NAME: return jsonify({"msg": "默认分组不可删除"}), 400
     
-    FundAsset.query.filter_by(user_id=user_id, group_name=name).delete()
-    FundGroup.query.filter_by(user_id=user_id, name=name).delete()
-    db.session.commit()
+    group = FundGroup.query.filter_by(user_id=user_id, name=name).first()
+    if group:
+        FundAsset.query.filter_by(group_id=group.id).delete()
+        db.session.delete(group)
+        db.session.commit()
+    _invalidate_user_cache(user_id)
     return jsonify({"msg": "已删除分组及资产"}), 200
 
 # ==========================================
@@ -305,6 +488,7 @@ def delete_asset(id):
     try:
         db.session.delete(asset)
         db.session.commit()
+        _invalidate_user_cache(user_id)
         return jsonify({"msg": "删除成功"}), 200
     except Exception as e:
         db.session.rollback()
@@ -1,6 +1,6 @@
 import requests
 from flask import Blueprint, request, jsonify
-from ..models import db, User
+from ..services.identity import IdentityService
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -11,10 +11,6 @@ def login():
     if not openid:
         return jsonify({"msg": "请在微信环境访问"}), 401
     
-    user = User.query.filter_by(openid=openid).first()
-    if not user:
-        user = User(openid=openid)
-        db.session.add(user)
-        db.session.commit()
+    IdentityService.resolve(openid)
     
     return jsonify({"msg": "登录成功", "openid": openid})
\ No newline at end of file
@@ -1,27 +1,14 @@
 from flask import Blueprint, request, jsonify
 from app.services.wechat_ocr import WeChatOCRService
-from ..models import db, User
+from app.services.ocr_jobs import OcrJobService, OcrQueueFull
+from ..services.identity import get_current_user_id
 import requests
 import traceback
 
 ocr_bp = Blueprint('ocr', __name__)
 
 # ==========================================
-# 🛡️ 辅助函数：通过微信 Header 获取用户 ID
-# ==========================================
-def get_current_user_id():
-    openid = request.headers.get('x-wx-openid')
-    if not openid:
-        return 1  # 本地调试默认 ID
-    user = User.query.filter_by(openid=openid).first()
-    if not user:
-        user = User(openid=openid)
-        db.session.add(user)
-        db.session.commit()
-    return user.id
-
-# ==========================================
-# 🟢 OCR 上传识别接口 (fileID 版)
+# 🟢 OCR 上传识别接口 (fileID 版，同步等待结果；保留给旧版小程序，新版请用 /jobs)
 # ==========================================
 @ocr_bp.route('/upload', methods=['POST'])
 def upload_ocr_by_fileid():
@@ -44,4 +31,41 @@ def upload_ocr_by_fileid():
     except Exception as e:
         print("❌ OCR 接口发生严重错误！")
         traceback.print_exc()
-        return jsonify({"msg": f"识别失败: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"msg": f"识别失败: {str(e)}"}), 500
+
+# ==========================================
+# 🟢 OCR 异步任务：提交后立即返回 job_id，客户端轮询 /jobs/<job_id>
+# ==========================================
+@ocr_bp.route('/jobs', methods=['POST'])
+def submit_ocr_job():
+    user_id = get_current_user_id()
+    data = request.get_json() or {}
+    file_id = data.get('file_id')
+
+    if not file_id:
+        return jsonify({"msg": "缺少 file_id 参数"}), 400
+
+    try:
+        job = OcrJobService.submit(user_id, file_id)
+    except OcrQueueFull as e:
+        return jsonify({"msg": str(e)}), 429
+
+    print(f"📥 用户 {user_id} 提交 OCR 任务 {job.id}, FileID: {file_id}")
+    return jsonify({"job_id": job.id, "status": job.status}), 202
+
+@ocr_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_ocr_job(job_id):
+    """status: queued / running (stage 为当前阶段) / done (list 为识别结果) / failed (error 为原因)"""
+    user_id = get_current_user_id()
+    job = OcrJobService.get(job_id, user_id)
+    if not job:
+        return jsonify({"msg": "任务不存在"}), 404
+    return jsonify(job.to_dict()), 200
+
+# ==========================================
+# 📊 OCR 缓存与任务统计
+# ==========================================
+@ocr_bp.route('/stats', methods=['GET'])
+def get_ocr_cache_stats():
+    """OCR 结果缓存命中/未命中计数；jobs 为本进程任务队列深度与各阶段耗时"""
+    return jsonify({**WeChatOCRService.cache_stats(), "jobs": OcrJobService.stats()})
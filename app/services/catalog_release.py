@@ -0,0 +1,77 @@
+import json
+import time
+import zlib
+import logging
+
+from .. import db
+from ..models import FundCatalogRelease
+from .fund_catalog import FundCatalog, write_fund_json
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogRelease:
+    """
+    🗂️ 基金名称-代码表的版本化发布
+    - leader 拉取后调用 publish：先原子替换本地 funds.json / funds.catalog，再把同一版本写入 fund_catalog_releases
+    - 所有进程定时 sync：只查一个版本号，落后时才下载 payload 重建本地文件 (同一台机器上先到的 worker 写，其余直接复用)
+    - 本地文件替换后，WeChatOCRService.get_matcher 按修改时间发现新版本，重新 mmap 打开即可，请求不受阻塞
+    """
+    NAME = 'funds'
+
+    @classmethod
+    def publish(cls, fund_map):
+        """发布新版本 (需要应用上下文)，返回版本号"""
+        version = int(time.time() * 1000)
+        # 先写 json 再写目录：目录文件比 json 新，get_matcher 不会误判为需要从 json 重建
+        write_fund_json(fund_map)
+        FundCatalog.write(fund_map, version=version)
+
+        payload = zlib.compress(json.dumps(fund_map, ensure_ascii=False).encode('utf-8'))
+        row = db.session.get(FundCatalogRelease, cls.NAME)
+        if row is None:
+            row = FundCatalogRelease(name=cls.NAME)
+            db.session.add(row)
+        row.version, row.count, row.payload = version, len(fund_map), payload
+        db.session.commit()
+        return version
+
+    @staticmethod
+    def local_version():
+        return FundCatalog.read_version()
+
+    @classmethod
+    def published_version(cls):
+        return db.session.query(FundCatalogRelease.version).filter_by(name=cls.NAME).scalar() or 0
+
+    @classmethod
+    def sync(cls):
+        """
+        本地目录落后于已发布版本时下载并替换 (需要应用上下文)
+        返回新版本号，已是最新时返回 None
+        """
+        from .wechat_ocr import WeChatOCRService
+
+        version = cls.published_version()
+        if not version or version <= cls.local_version():
+            db.session.remove()
+            return None
+
+        row = db.session.get(FundCatalogRelease, cls.NAME)
+        fund_map = json.loads(zlib.decompress(row.payload).decode('utf-8'))
+        version = row.version
+        db.session.remove()
+
+        write_fund_json(fund_map)
+        FundCatalog.write(fund_map, version=version)
+        # 在定时任务线程里换上新匹配器，请求线程拿到的已是新版本
+        WeChatOCRService.get_matcher()
+        logger.info(f"🗂️ 基金目录已同步到版本 {version} ({len(fund_map)} 条)")
+        return version
+
+    @classmethod
+    def status(cls):
+        return {
+            "local_version": cls.local_version(),
+            "published_version": cls.published_version(),
+        }
@@ -0,0 +1,169 @@
+import os
+import json
+import mmap
+import time
+import struct
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from ..utils.helpers import atomic_write
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+CATALOG_PATH = os.path.join(_DATA_DIR, 'funds.catalog')
+FUND_JSON_PATH = os.path.join(_DATA_DIR, 'funds.json')
+
+# 文件头：魔数、版本号 (生成时间毫秒)、名称数、索引字符数、倒排表总长度、名称/匹配串 UTF-8 总字节数
+_HEADER = struct.Struct('<8sQIIIII')
+_MAGIC = b'JDFUNDC1'
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+class FundCatalog:
+    """
+    📚 基金目录二进制文件 (app/data/funds.catalog)：名称、代码与 FundMatcher 的倒排索引
+    - 由 TaskService.update_fund_json / scripts/init_fund_data.py 生成，写临时文件后原子替换
+    - 各 worker 以只读 mmap 打开，所有数组都是文件页上的零拷贝视图，多进程共享同一份物理内存
+    - 打开新版本只需解析文件头，名称与匹配串按下标现用现解码
+    """
+
+    def __init__(self, buf):
+        self._buf = buf
+        magic, self.version, n, m, total, names_len, keys_len = _HEADER.unpack_from(buf, 0)
+        if magic != _MAGIC:
+            raise ValueError("不是基金目录文件")
+        self._n = n
+        offset = _HEADER.size
+
+        def view(dtype, count):
+            nonlocal offset
+            offset = _align(offset)
+            arr = np.frombuffer(buf, dtype=dtype, count=count, offset=offset)
+            offset += arr.nbytes
+            return arr
+
+        self._codes = view('S6', n)
+        self._name_off = view('<i4', n + 1)
+        self._key_off = view('<i4', n + 1)
+        self.lengths = view('<i4', n)
+        self._chars = view('<u4', m)
+        self._post_off = view('<i4', m + 1)
+        self._post_ids = view('<i4', total)
+        self._post_counts = view('<i2', total)
+        self._names = view('u1', names_len)
+        self._keys = view('u1', keys_len)
+
+    # ==========================================
+    # 读取
+    # ==========================================
+    @staticmethod
+    def read_version(path=CATALOG_PATH):
+        """只读文件头取版本号；文件不存在或格式不对时返回 0"""
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(_HEADER.size)
+        except OSError:
+            return 0
+        if len(header) < _HEADER.size or header[:8] != _MAGIC:
+            return 0
+        return _HEADER.unpack(header)[1]
+
+    @classmethod
+    def open(cls, path=CATALOG_PATH):
+        """只读 mmap 打开；旧版本对象不再被引用后由 GC 自动解除映射"""
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buf)
+
+    def __len__(self):
+        return self._n
+
+    def code(self, idx):
+        return self._codes[idx].decode('ascii')
+
+    def name(self, idx):
+        return self._names[self._name_off[idx]:self._name_off[idx + 1]].tobytes().decode('utf-8')
+
+    def key(self, idx):
+        return self._keys[self._key_off[idx]:self._key_off[idx + 1]].tobytes().decode('utf-8')
+
+    def posting(self, ch):
+        """返回 (名称下标数组, 该字符在名称中出现的次数)，字符不在索引中时返回 None"""
+        cp = ord(ch)
+        pos = int(np.searchsorted(self._chars, cp))
+        if pos >= len(self._chars) or self._chars[pos] != cp:
+            return None
+        start, end = self._post_off[pos], self._post_off[pos + 1]
+        return self._post_ids[start:end], self._post_counts[start:end]
+
+    # ==========================================
+    # 生成
+    # ==========================================
+    @staticmethod
+    def build(fund_map, version=None):
+        """{基金简称: 基金代码} -> 目录文件内容 (bytes)"""
+        # 只在生成时需要 rapidfuzz 预处理；读取版本号 / 打开文件不导入
+        from .fund_matcher import normalize
+
+        names = list(fund_map.keys())
+        codes = [str(fund_map[n]) for n in names]
+        keys = [normalize(n) for n in names]
+
+        postings = defaultdict(lambda: ([], []))
+        for idx, key in enumerate(keys):
+            for ch, cnt in Counter(key).items():
+                ids, counts = postings[ch]
+                ids.append(idx)
+                counts.append(cnt)
+        chars = sorted(postings, key=ord)
+
+        def blob(strings):
+            encoded = [s.encode('utf-8') for s in strings]
+            offsets = np.zeros(len(encoded) + 1, dtype='<i4')
+            offsets[1:] = np.cumsum([len(e) for e in encoded])
+            return b''.join(encoded), offsets
+
+        names_blob, name_off = blob(names)
+        keys_blob, key_off = blob(keys)
+        post_off = np.zeros(len(chars) + 1, dtype='<i4')
+        post_off[1:] = np.cumsum([len(postings[ch][0]) for ch in chars])
+        post_ids = np.array([i for ch in chars for i in postings[ch][0]], dtype='<i4')
+        post_counts = np.array([c for ch in chars for c in postings[ch][1]], dtype='<i2')
+
+        sections = [
+            np.array(codes, dtype='S6').tobytes(),
+            name_off.tobytes(),
+            key_off.tobytes(),
+            np.array([len(k) for k in keys], dtype='<i4').tobytes(),
+            np.array([ord(ch) for ch in chars], dtype='<u4').tobytes(),
+            post_off.tobytes(),
+            post_ids.tobytes(),
+            post_counts.tobytes(),
+            names_blob,
+            keys_blob,
+        ]
+        out = bytearray(_HEADER.pack(_MAGIC, version or int(time.time() * 1000), len(names), len(chars),
+                                     len(post_ids), len(names_blob), len(keys_blob)))
+        for section in sections:
+            out += b'\0' * (_align(len(out)) - len(out))
+            out += section
+        return bytes(out)
+
+    @classmethod
+    def from_map(cls, fund_map):
+        """内存中构建 (不落盘)，目录文件不可写时兜底"""
+        return cls(cls.build(fund_map))
+
+    @classmethod
+    def write(cls, fund_map, path=CATALOG_PATH, version=None):
+        """写临时文件后原子替换：正在读旧版本的进程不受影响，返回写入的名称数"""
+        atomic_write(path, cls.build(fund_map, version))
+        return len(fund_map)
+
+
+def write_fund_json(fund_map, path=FUND_JSON_PATH):
+    """funds.json 同样写临时文件后原子替换，读取方不会读到半个文件"""
+    atomic_write(path, json.dumps(fund_map, ensure_ascii=False).encode('utf-8'))
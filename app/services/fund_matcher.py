@@ -0,0 +1,84 @@
+from collections import Counter
+
+import numpy as np
+from rapidfuzz import fuzz
+from rapidfuzz.process import cdist
+from rapidfuzz.utils import default_process
+
+# 与 thefuzz 的 force_ascii 预处理一致：去掉 128~255 的字符
+_ASCII_TABLE = {i: None for i in range(128, 256)}
+
+
+def normalize(name):
+    """
+    复刻 thefuzz.process.extractOne(scorer=fuzz.token_sort_ratio) 对字符串的预处理：
+    去掉 128~255 字符 → 小写、非字母数字替换为空格 → 按空格切词排序后拼接
+    """
+    processed = default_process(default_process(name).translate(_ASCII_TABLE))
+    return " ".join(sorted(processed.split()))
+
+
+class FundMatcher:
+    """
+    🔎 基金名称模糊匹配 (结果与 thefuzz.process.extractOne + token_sort_ratio 一致)
+    - token_sort_ratio 即排序后字符串的 Indel 相似度 = 200 * LCS / (la + lb)
+    - LCS 不超过两串字符多重集的交集大小 C，因此 200 * C / (la + lb) 是分数上界
+    - 字符倒排索引随基金目录 (FundCatalog) 一起生成，查询时用 NumPy 一次算出所有名称的上界，
+      按上界从高到低分批精确打分，上界低于当前最好分数时停止 (通常只需精确比较几十个名称)
+    - 同分时取基金表里靠前的名称，与 extractOne 保持一致
+    """
+    BATCH = 64
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def __len__(self):
+        return len(self.catalog)
+
+    def _upper_bounds(self, key):
+        common = np.zeros(len(self.catalog), dtype=np.int32)
+        for ch, q_cnt in Counter(key).items():
+            posting = self.catalog.posting(ch)
+            if posting is not None:
+                ids, counts = posting
+                common[ids] += np.minimum(counts, q_cnt)
+        return 200.0 * common / (len(key) + self.catalog.lengths)
+
+    def match_key(self, key):
+        """key 为 normalize 之后的查询串，返回 (名称下标, 未取整分数)；没有任何可比名称时返回 (None, 0)"""
+        if not key or not len(self.catalog):
+            return None, 0
+        bounds = self._upper_bounds(key)
+        # 按 (上界降序, 下标升序) 排列候选；上界为 0 的名称分数必为 0，不参与
+        order = np.lexsort((np.arange(len(bounds)), -bounds))
+        order = order[bounds[order] > 0]
+
+        best_idx, best_score = None, 0.0
+        for start in range(0, len(order), self.BATCH):
+            chunk = order[start:start + self.BATCH]
+            if bounds[chunk[0]] + 1e-9 < best_score:
+                break
+            scores = cdist([key], [self.catalog.key(i) for i in chunk], scorer=fuzz.ratio)[0]
+            for idx, score in zip(chunk.tolist(), scores.tolist()):
+                if score > best_score or (score == best_score and best_idx is not None and idx < best_idx):
+                    best_idx, best_score = idx, score
+        if best_idx is None:
+            # 所有名称与查询都没有公共字符，extractOne 此时返回第一个名称、0 分
+            return 0, 0.0
+        return best_idx, best_score
+
+    def match(self, query):
+        """返回 (基金代码, 0~100 的整数分)"""
+        idx, score = self.match_key(normalize(query))
+        if idx is None:
+            return "", 0
+        return self.catalog.code(idx), int(round(score))
+
+    def match_many(self, queries):
+        """一张截图的所有候选名称一起匹配，返回与 queries 等长的 [(基金代码, 分数)]；相同的名称只算一次"""
+        keys = [normalize(q) for q in queries]
+        results = {}
+        for key in set(keys):
+            idx, score = self.match_key(key)
+            results[key] = ("", 0) if idx is None else (self.catalog.code(idx), int(round(score)))
+        return [results[k] for k in keys]
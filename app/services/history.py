@@ -0,0 +1,145 @@
+import time
+import logging
+from datetime import date, timedelta
+
+import numpy as np
+
+from .. import db
+from ..models import FundNavHistory, FundAsset
+from ..utils.cache import TTLCache
+from .market import MarketService
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = date(1970, 1, 1)
+
+
+def _to_days(d):
+    return (d - _EPOCH).days
+
+
+def _from_days(n):
+    return _EPOCH + timedelta(days=int(n))
+
+
+class NavHistoryService:
+    """
+    📈 本地历史净值库
+    - 每晚通过 akshare 拉取持仓基金的日净值，只追加缺失的日期 (数据源只能全量下载，存储是增量的)
+    - 每个代码的序列以 int32 日期 + float64 净值两个数组打包存储 (fund_nav_history 表)
+    - 区间查询用二分定位，供走势图与区间收益率计算
+    """
+    # 解码后的数组缓存：code -> (updated_at, dates, navs)
+    _arrays = TTLCache(maxsize=500)
+    _ARRAY_TTL = 3600
+
+    # ==========================================
+    # 📥 增量拉取
+    # ==========================================
+    @classmethod
+    def _fetch(cls, code):
+        """
+        拉取净值序列，返回按日期升序的 (int32 天数数组, float64 净值数组)
+        两个数据源都不支持按日期区间拉取，每次都是全量下载，由 ingest 只追加缺失的日期
+        """
+        import akshare as ak
+        import pandas as pd
+
+        if MarketService.is_exchange_traded(code):
+            df = ak.fund_etf_hist_sina(symbol=MarketService._sina_symbol(code))
+            dates, navs = pd.to_datetime(df['date']), df['close']
+        else:
+            df = ak.fund_open_fund_info_em(symbol=code, indicator="单位净值走势")
+            dates, navs = pd.to_datetime(df['净值日期'], errors='coerce'), pd.to_numeric(df['单位净值'], errors='coerce')
+
+        frame = pd.DataFrame({"d": dates, "nav": navs}).dropna().sort_values("d")
+        days = (frame["d"].dt.normalize() - pd.Timestamp(_EPOCH)).dt.days.to_numpy(dtype='<i4')
+        return days, frame["nav"].to_numpy(dtype='<f8')
+
+    @classmethod
+    def ingest(cls, code):
+        """增量更新单个基金，返回新增的天数"""
+        row = db.session.get(FundNavHistory, code)
+        old_dates, old_navs = cls._unpack(row) if row else (np.empty(0, '<i4'), np.empty(0, '<f8'))
+
+        new_dates, new_navs = cls._fetch(code)
+        if len(old_dates):
+            mask = new_dates > old_dates[-1]
+            new_dates, new_navs = new_dates[mask], new_navs[mask]
+        # 去掉同一天的重复数据
+        new_dates, idx = np.unique(new_dates, return_index=True)
+        new_navs = new_navs[idx]
+        if not len(new_dates):
+            return 0
+
+        dates = np.concatenate([old_dates, new_dates])
+        navs = np.concatenate([old_navs, new_navs])
+        if row is None:
+            row = FundNavHistory(code=code)
+            db.session.add(row)
+        row.dates = dates.tobytes()
+        row.navs = navs.tobytes()
+        row.count = len(dates)
+        row.last_date = _from_days(dates[-1])
+        db.session.commit()
+        cls._arrays.delete(code)
+        return len(new_dates)
+
+    @classmethod
+    def ingest_all(cls, pause=0.3):
+        """定时任务：增量更新所有持仓基金，返回 (成功数, 新增天数)"""
+        codes = [row[0] for row in db.session.query(FundAsset.fund_code).distinct().all() if row[0]]
+        ok, added = 0, 0
+        for code in codes:
+            try:
+                added += cls.ingest(code)
+                ok += 1
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"⚠️ 历史净值更新失败 {code}: {str(e)}")
+            time.sleep(pause)  # 避免被数据源限流
+        return ok, added
+
+    # ==========================================
+    # 🔍 区间查询
+    # ==========================================
+    @staticmethod
+    def _unpack(row):
+        return np.frombuffer(row.dates, dtype='<i4'), np.frombuffer(row.navs, dtype='<f8')
+
+    @classmethod
+    def _load(cls, code):
+        cached = cls._arrays.get(code)
+        if cached is not None:
+            return cached
+        row = db.session.get(FundNavHistory, code)
+        arrays = cls._unpack(row) if row else None
+        if arrays is not None:
+            cls._arrays.set(code, arrays, cls._ARRAY_TTL)
+        return arrays
+
+    @classmethod
+    def get_range(cls, code, start=None, end=None):
+        """返回 [start, end] 区间内的 (日期数组, 净值数组)，无数据返回两个空数组"""
+        arrays = cls._load(code)
+        if arrays is None:
+            return np.empty(0, '<i4'), np.empty(0, '<f8')
+        dates, navs = arrays
+        lo = np.searchsorted(dates, _to_days(start), 'left') if start else 0
+        hi = np.searchsorted(dates, _to_days(end), 'right') if end else len(dates)
+        return dates[lo:hi], navs[lo:hi]
+
+    @classmethod
+    def period_return(cls, code, start=None, end=None):
+        """区间收益率 (%)：区间内最后一个净值相对第一个净值的涨跌幅"""
+        _, navs = cls.get_range(code, start, end)
+        if len(navs) < 2 or navs[0] == 0:
+            return None
+        return round(float((navs[-1] / navs[0] - 1) * 100), 2)
+
+    @classmethod
+    def get_points(cls, code, start=None, end=None):
+        """走势图数据：[["YYYY-MM-DD", nav], ...]"""
+        dates, navs = cls.get_range(code, start, end)
+        days = dates.astype('datetime64[D]').astype(str)
+        return [[d, round(float(n), 4)] for d, n in zip(days, navs)]
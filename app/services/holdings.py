@@ -0,0 +1,40 @@
+from collections import namedtuple
+
+from config import Config
+from .. import db
+from ..models import FundAsset, FundGroup
+from .user_cache import UserCache
+
+# 精简的持仓记录 (不持有 ORM 对象，缓存里不会引用数据库会话)
+Position = namedtuple('Position', 'id fund_code fund_name group_name holding_shares cost_price')
+
+
+class HoldingsService:
+    """
+    📦 用户持仓缓存
+    - 轮询接口 (/quotes、/list、/summary、/stream) 从这里读持仓，缓存命中时不查库
+    - 持仓只会被 /add、/move、/groups/*、/delete 修改，这些接口提交后调用 UserCache.invalidate 失效
+    """
+    _cache = UserCache('holdings', maxsize=Config.HOLDINGS_CACHE_SIZE, ttl=Config.HOLDINGS_CACHE_TTL)
+
+    @classmethod
+    def get(cls, user_id):
+        """返回该用户的持仓元组 (按 id 排序)"""
+        positions = cls._cache.get(user_id)
+        if positions is None:
+            positions = cls._load(user_id)
+            cls._cache.set(user_id, positions)
+        return positions
+
+    @staticmethod
+    def _load(user_id):
+        rows = db.session.query(
+            FundAsset.id, FundAsset.fund_code, FundAsset.fund_name, FundGroup.name,
+            FundAsset.holding_shares, FundAsset.cost_price
+        ).join(FundGroup, FundAsset.group_id == FundGroup.id
+        ).filter(FundAsset.user_id == user_id).order_by(FundAsset.id).all()
+        return tuple(Position(*row) for row in rows)
+
+    @classmethod
+    def stats(cls):
+        return cls._cache.stats()
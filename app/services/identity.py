@@ -0,0 +1,77 @@
+import logging
+
+from flask import g, request
+from sqlalchemy.exc import IntegrityError
+
+from config import Config
+from .. import db
+from ..models import User
+from ..utils.cache import TTLCache, SharedTier
+from ..utils.db_routing import use_primary
+from .user_cache import UserCache
+
+logger = logging.getLogger(__name__)
+
+# 本地调试 (没有 x-wx-openid) 时的默认用户
+LOCAL_USER_ID = 1
+
+
+class IdentityService:
+    """
+    🪪 openid -> user_id 解析 (所有蓝图共用)
+    - 进程内 LRU 命中时不查库；配置了 Redis 时，其他进程解析过的 openid 也不用查库
+    - 首次访问的 openid 自动建用户；并发首访撞上唯一索引时回滚后重新查询
+    """
+    _cache = TTLCache(maxsize=Config.IDENTITY_CACHE_SIZE)
+    _shared = SharedTier(getattr(Config, 'REDIS_URL', None), prefix='jidong:uid')
+
+    @classmethod
+    def resolve(cls, openid, create=True):
+        """返回 openid 对应的用户 ID；create=False 且用户不存在时返回 None"""
+        user_id = cls._cache.get(openid)
+        if user_id is not None:
+            return user_id
+
+        user_id = cls._shared.get_many([openid]).get(openid)
+        if user_id is None:
+            user_id = db.session.query(User.id).filter_by(openid=openid).scalar()
+        if user_id is None and create:
+            user_id = cls._create(openid)
+        if user_id is not None:
+            cls._remember(openid, user_id)
+        return user_id
+
+    @classmethod
+    def _create(cls, openid):
+        user = User(openid=openid)
+        db.session.add(user)
+        try:
+            db.session.commit()
+            logger.info(f"🆕 新用户注册: user_id={user.id}")
+            return user.id
+        except IntegrityError:
+            # 同一 openid 的并发首访：另一个请求已经建好了
+            db.session.rollback()
+            return db.session.query(User.id).filter_by(openid=openid).scalar()
+
+    @classmethod
+    def _remember(cls, openid, user_id):
+        cls._cache.set(openid, user_id, Config.IDENTITY_CACHE_TTL)
+        cls._shared.set_many({openid: user_id}, ttl=Config.IDENTITY_CACHE_TTL)
+
+    @classmethod
+    def stats(cls):
+        return cls._cache.stats()
+
+
+def get_current_user_id():
+    """
+    通过云托管注入的 x-wx-openid 识别用户
+    依靠 SQLALCHEMY_ENGINE_OPTIONS 中的 pool_pre_ping 自动重连 MySQL
+    """
+    openid = request.headers.get('x-wx-openid')
+    user_id = IdentityService.resolve(openid) if openid else LOCAL_USER_ID
+    # 读己之写：刚改过持仓的用户，这次只读请求也走主库，避免从库复制延迟读到旧数据
+    if g.get('db_read_only') and UserCache.written_within(user_id, Config.DB_REPLICA_STICKY_SECONDS):
+        use_primary(db.session)
+    return user_id
@@ -0,0 +1,112 @@
+import os
+import time
+import socket
+import logging
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from config import Config
+from .. import db
+from ..models import SchedulerLease
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLease:
+    """
+    👑 定时任务 leader 选举 (数据库租约)
+    - 所有 worker / 实例都跑心跳任务：持有者续期，其他进程在租约过期后抢占
+    - 抢占与续期都是一条带条件的 UPDATE (holder 是自己，或租约已过期)，同一时刻只有一个进程成功
+    - 本地判断 is_leader 时预留一个心跳周期的余量：续期失败的旧 leader 会先于租约过期停止干活
+    """
+    NAME = 'scheduler'
+    _valid_until = 0
+    _holder = None
+    _holder_pid = None
+
+    @classmethod
+    def holder_id(cls):
+        # gunicorn fork 之后 pid 会变，按当前 pid 重新生成
+        if cls._holder_pid != os.getpid():
+            cls._holder_pid = os.getpid()
+            cls._holder = f"{socket.gethostname()}:{cls._holder_pid}"
+        return cls._holder
+
+    @classmethod
+    def heartbeat(cls):
+        """续期或抢占租约 (需要应用上下文)，返回本进程是否为 leader"""
+        me, now = cls.holder_id(), time.time()
+        expires_at = now + Config.LEADER_LEASE_TTL
+        was_leader = cls.is_leader()
+        try:
+            won = db.session.execute(
+                update(SchedulerLease)
+                .where(SchedulerLease.name == cls.NAME)
+                .where((SchedulerLease.holder == me) | (SchedulerLease.expires_at < now))
+                .values(holder=me, expires_at=expires_at, heartbeat_at=now)
+            ).rowcount == 1
+            if not won and db.session.get(SchedulerLease, cls.NAME) is None:
+                db.session.add(SchedulerLease(name=cls.NAME, holder=me, expires_at=expires_at, heartbeat_at=now))
+                won = True
+            db.session.commit()
+        except IntegrityError:
+            # 另一个进程同时插入了第一行
+            db.session.rollback()
+            won = False
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"⚠️ leader 租约续期失败: {str(e)}")
+            won = False
+
+        if won:
+            cls._valid_until = expires_at - Config.LEADER_HEARTBEAT_INTERVAL
+            if not was_leader:
+                logger.info(f"👑 {me} 成为定时任务 leader")
+        else:
+            cls._valid_until = 0
+            if was_leader:
+                logger.warning(f"👋 {me} 失去定时任务 leader 身份")
+        return won
+
+    @classmethod
+    def is_leader(cls):
+        return time.time() < cls._valid_until
+
+    @classmethod
+    def claim(cls):
+        """leader 专属任务开头调用 (需要应用上下文)：本进程还不是 leader 时先尝试抢占一次"""
+        return cls.is_leader() or cls.heartbeat()
+
+    @classmethod
+    def release(cls):
+        """进程退出时主动让出租约，其他进程下一次心跳即可接管 (需要应用上下文)"""
+        if not cls.is_leader():
+            return
+        cls._valid_until = 0
+        try:
+            db.session.execute(
+                update(SchedulerLease)
+                .where(SchedulerLease.name == cls.NAME, SchedulerLease.holder == cls.holder_id())
+                .values(expires_at=0)
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+
+    @classmethod
+    def leader_alive(cls):
+        """集群里当前是否有未过期的 leader (任意进程)"""
+        row = db.session.get(SchedulerLease, cls.NAME)
+        return row is not None and row.expires_at > time.time()
+
+    @classmethod
+    def status(cls):
+        row = db.session.get(SchedulerLease, cls.NAME)
+        return {
+            "me": cls.holder_id(),
+            "is_leader": cls.is_leader(),
+            "holder": row.holder if row else None,
+            "expires_in": round(row.expires_at - time.time(), 1) if row else None,
+        }
+
@@ -1,15 +1,213 @@
-import requests
 import re
 import time
 import json
 import logging
+import threading
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future
+from flask import has_app_context
+from config import Config
+from ..utils.cache import TTLCache, SharedTier
+from .upstream import UpstreamClient
+from .quote_store import QuoteStore
+from .trading_calendar import TradingCalendar
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+class QuoteCache:
+    """
+    行情两级缓存：进程内 LRU(TTL) + 可选 Redis 共享层
+    - 交易时段内只缓存几十秒；收盘后缓存到下一次开盘 (有上限)
+    - 只缓存抓取成功的行情，error_fallback 不进缓存
+    """
+
+    def __init__(self):
+        self.local = TTLCache(maxsize=Config.QUOTE_CACHE_SIZE)
+        self.shared = SharedTier(getattr(Config, 'REDIS_URL', None), prefix='jidong:quote')
+
+    @staticmethod
+    def ttl(now=None):
+        if TradingCalendar.is_open(now):
+            return Config.QUOTE_CACHE_TTL_TRADING
+        return max(Config.QUOTE_CACHE_TTL_TRADING,
+                   min(TradingCalendar.seconds_until_next_open(now), Config.QUOTE_CACHE_TTL_CLOSED_MAX))
+
+    def get_many(self, codes):
+        """返回 {code: quote}，只包含命中的代码"""
+        found = {}
+        for code in codes:
+            quote = self.local.get(code)
+            if quote is not None:
+                found[code] = quote
+
+        missing = [c for c in codes if c not in found]
+        if missing:
+            # 共享层里存的是 {"q": 行情, "exp": 过期时间戳}，回填本地时沿用剩余有效期
+            now = time.time()
+            for code, entry in self.shared.get_many(missing).items():
+                remain = entry.get('exp', 0) - now
+                if remain <= 0:
+                    continue
+                self.local.set(code, entry['q'], remain)
+                found[code] = entry['q']
+        return found
+
+    def get_stale_many(self, codes):
+        """读取本地已过期但尚未被淘汰的行情 (上游失败 / 熔断时兜底)"""
+        found = {}
+        for code in codes:
+            quote = self.local.get(code, allow_stale=True)
+            if quote is not None:
+                found[code] = quote
+        return found
+
+    def set_many(self, quotes, ttl=None):
+        if not quotes:
+            return
+        ttl = ttl or self.ttl()
+        for code, quote in quotes.items():
+            self.local.set(code, quote, ttl)
+        exp = time.time() + ttl
+        self.shared.set_many({code: {"q": q, "exp": exp} for code, q in quotes.items()}, ttl)
+
+    def stats(self):
+        return {"local": self.local.stats(), "shared": self.shared.stats()}
+
+
+class QuoteSnapshot:
+    """
+    后台预取任务发布的行情快照 (进程内)，同时也是行情更新推送源
+    - 请求线程只读快照，不等待网络；超过 max_age 未刷新的快照视为失效 (预取任务停了)
+    - version 为毫秒时间戳 (单调递增)，每个代码记录值最后一次变化时的 version
+    - 推送流通过 wait_for_update 阻塞等待新版本，只推送变化的代码
+    """
+
+    def __init__(self):
+        self._quotes = {}
+        self._seen = {}     # code -> 最近一次见到的 (nav, gsz, gszzl)
+        self._changed = {}  # code -> 值最后一次变化时的 version
+        self._cond = threading.Condition()
+        self.version = 0
+        self.updated_at = 0
+
+    @staticmethod
+    def _values(quote):
+        return quote.get('nav'), quote.get('gsz'), quote.get('gszzl')
+
+    def publish(self, quotes):
+        """发布一批行情，返回值发生变化的代码列表"""
+        with self._cond:
+            changed = self._track(quotes)
+            self.updated_at = time.time()
+            return changed
+
+    def track(self, quotes):
+        """
+        记录请求线程拿到的行情 (增量接口与推送流都依赖它)，不刷新快照时间
+        值和变化标记一起更新：推送的永远是触发变化的那个值，之后预取到同样的值也不会被漏掉
+        """
+        with self._cond:
+            return self._track(quotes)
+
+    def _track(self, quotes):
+        version = max(self.version + 1, int(time.time() * 1000))
+        changed = []
+        for code, quote in quotes.items():
+            current = self._quotes.get(code)
+            if current is not None and quote.get('_ts', 0) < current.get('_ts', 0):
+                # 兜底用的旧值 (过期缓存 / 数据库) 不覆盖已有的新值
+                continue
+            self._quotes[code] = quote
+            values = self._values(quote)
+            if self._seen.get(code) != values:
+                self._seen[code] = values
+                self._changed[code] = version
+                changed.append(code)
+        if changed:
+            self.version = version
+            self._cond.notify_all()
+        return changed
+
+    def wait_for_update(self, since, timeout):
+        """阻塞等待 version 超过 since，返回最新 version (超时返回原值)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version > since, timeout)
+            return self.version
+
+    def changed_since(self, codes, since):
+        """返回 version 之后值有变化的代码 {code: quote} (只含快照里的代码，推送流使用)"""
+        quotes, changed = self._quotes, self._changed
+        return {c: quotes[c] for c in codes if c in quotes and changed.get(c, 0) > since}
+
+    def is_fresh(self):
+        return time.time() - self.updated_at <= Config.QUOTE_SNAPSHOT_MAX_AGE
+
+    def get_many(self, codes):
+        """快照整体新鲜时返回各代码的值；单个代码的值也要在 max_age 之内 (没人再预取的代码会一直留在快照里)"""
+        if not self.is_fresh():
+            return {}
+        oldest = time.time() - Config.QUOTE_SNAPSHOT_MAX_AGE
+        quotes = self._quotes
+        return {c: quotes[c] for c in codes if c in quotes and quotes[c].get('_ts', 0) >= oldest}
+
+    def get_last(self, codes):
+        """不检查新鲜度，返回最近一次发布的值 (上游失败时兜底)"""
+        quotes = self._quotes
+        return {c: quotes[c] for c in codes if c in quotes}
+
+
+class SingleFlight:
+    """
+    并发请求合并：同一代码同一时刻只有一个线程在抓取，其他线程等待它的结果
+    开盘瞬间大量用户同时打开小程序时，避免对同一基金重复请求上游
+    """
+
+    def __init__(self, wait_timeout=15):
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._calls = {}  # code -> Future
+        self.shared = 0   # 被合并掉的请求数
+
+    def do_many(self, keys, fetch):
+        """
+        fetch(keys) -> {key: value}
+        只对没有在途请求的 key 调用 fetch，其余 key 等待在途请求的结果
+        """
+        owned, waiting = {}, {}
+        with self._lock:
+            for key in keys:
+                fut = self._calls.get(key)
+                if fut is None:
+                    owned[key] = self._calls[key] = Future()
+                else:
+                    waiting[key] = fut
+            self.shared += len(waiting)
+
+        results = {}
+        try:
+            if owned:
+                results = fetch(list(owned)) or {}
+        finally:
+            with self._lock:
+                for key in owned:
+                    self._calls.pop(key, None)
+            for key, fut in owned.items():
+                fut.set_result(results.get(key))
+
+        for key, fut in waiting.items():
+            try:
+                value = fut.result(timeout=self.wait_timeout)
+            except Exception:
+                value = None
+            if value is not None:
+                results[key] = value
+        return results
+
+
 class MarketService:
+    # 行情源返回这些状态码视为封禁 / 限流，直接熔断
+    _BAN_STATUS = (403, 429)
     # 模拟浏览器指纹
     _HEADERS = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
@@ -29,7 +227,7 @@ class MarketService:
             ts = int(time.time() * 1000)
             url = f"http://fundgz.1234567.com.cn/js/{code}.js?rt={ts}"
             
-            resp = requests.get(url, headers=cls._HEADERS, timeout=5)
+            resp = UpstreamClient.get(url, headers=cls._HEADERS)
             # 解析 jsonpgz(...) 格式
             match = re.search(r'jsonpgz\((.*)\);', resp.text)
             
@@ -64,10 +262,16 @@ class MarketService:
             logger.error(f"⚠️ 天天基金接口异常 {code}: {str(e)}")
             return code, None
 
+    # 行情缓存 / 预取快照 (进程级单例)
+    _cache = QuoteCache()
+    _snapshot = QuoteSnapshot()
+    _inflight = SingleFlight()
+
     @classmethod
     def batch_get_valuation(cls, fund_items):
         """
-        🚀 批量获取入口：支持多线程并发
+        🚀 批量获取入口：预取快照 > 行情缓存 > (行情不会变化时) 最近一次的值 > 多线程并发抓取未命中的代码
+        抓取失败的代码依次用最近快照、过期缓存、持久化行情兜底
         """
         # 兼容处理：如果是代码字符串列表，转为字典格式
         if fund_items and isinstance(fund_items[0], str):
@@ -76,58 +280,186 @@ class MarketService:
         if not fund_items:
             return {}
 
-        results = {}
+        # 同一基金可能出现在多个分组里，去重后再抓取
+        codes = list(dict.fromkeys(item.get('code') for item in fund_items if item.get('code')))
+        results = cls._snapshot.get_many(codes)
+        missing = [c for c in codes if c not in results]
+        if missing:
+            results.update(cls._cache.get_many(missing))
+            missing = [c for c in missing if c not in results]
+        if missing:
+            # 📅 此刻行情不可能变化的代码 (休市 / 节假日)：
+            # 最近一次的值只要是在最后一次可能变化之后抓到的，就是当前值，不再请求上游
+            frozen = [c for c in missing if not TradingCalendar.can_price_change(c)]
+            if frozen:
+                ttl = cls._cache.ttl()
+                for code, quote in cls._last_known(frozen).items():
+                    if quote.get('_ts', 0) >= TradingCalendar.last_change_at(code):
+                        cls._cache.local.set(code, quote, ttl)
+                        results[code] = quote
+                missing = [c for c in missing if c not in results]
+        if not missing:
+            cls._snapshot.track(results)
+            return results
 
-        def _worker(item):
-            code = item.get('code')
-            if not code: return None
-            return cls.get_fund_quote(code)
-
-        # 默认使用 5 个线程，避免频繁请求被封 IP
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            responses = list(executor.map(_worker, fund_items))
-            for res in responses:
-                # 只有当抓取成功且数据体不为 None 时才存入
-                if res and res[1]:
-                    results[res[0]] = res[1]
-                elif res:
-                    # 彻底失败时，返回一个基础结构防止后端业务逻辑报错
-                    results[res[0]] = {
-                        "code": res[0], "nav": 0.0, "gsz": 0.0, "gszzl": 0.0,
-                        "source": "error_fallback"
-                    }
+        fetched = cls._fetch_quotes(missing)
+        failed = [c for c in missing if c not in fetched]
+        if failed:
+            # 上游失败 / 熔断中：用最近一次的值兜底；仍然没有的代码不返回，由路由层按成本价兜底
+            results.update(cls._last_known(failed))
 
+        cls._cache.set_many(fetched)
+        QuoteStore.stage(fetched)
+        results.update(fetched)
+        cls._snapshot.track(results)
         return results
 
+    @classmethod
+    def _last_known(cls, codes):
+        """最近一次成功的行情：快照 > 过期缓存 > 数据库 (fund_quotes)"""
+        known = cls._snapshot.get_last(codes)
+        known.update(cls._cache.get_stale_many([c for c in codes if c not in known]))
+        rest = [c for c in codes if c not in known]
+        if rest and has_app_context():
+            known.update(QuoteStore.load_many(rest))
+        return known
+
+    @classmethod
+    def refresh_quotes(cls, codes):
+        """
+        ⏰ 预取入口：绕过缓存直接抓取，并发布到快照 + 缓存
+        返回成功抓取的数量
+        """
+        codes = list(dict.fromkeys(c for c in codes if c))
+        if not codes:
+            return 0
+        # 预取用独立的线程池与限速预算，代码再多也不会让请求线程的未命中抓取排在后面
+        fetched = cls._fetch_upstream(codes, prefetch=True)
+        cls._cache.set_many(fetched)
+        cls._snapshot.publish(fetched)
+        QuoteStore.stage(fetched)
+        return len(fetched)
+
+    @classmethod
+    def apply_synced(cls, quotes):
+        """
+        🔁 非 leader 进程：把 leader 预取并落库的行情发布到本进程的快照 + 缓存 (不再落库)
+        quotes 为空也会刷新快照时间，表示 leader 的预取仍在正常进行
+        """
+        cls._cache.set_many(quotes)
+        return cls._snapshot.publish(quotes)
+
+    @classmethod
+    def _fetch_quotes(cls, codes):
+        """并发抓取一批代码 (合并在途请求)，返回 {code: quote}，失败的代码不出现在结果里"""
+        return cls._inflight.do_many(codes, cls._fetch_upstream)
+
+    @classmethod
+    def _fetch_upstream(cls, codes, prefetch=False):
+        # 场内基金走新浪批量接口 (一次请求多只)，场外基金逐只走天天基金
+        # prefetch=True：预取任务专用的线程池与限速预算 (UPSTREAM_PREFETCH_*)
+        etf_codes = [c for c in codes if cls.is_exchange_traded(c)]
+        otc_codes = [c for c in codes if not cls.is_exchange_traded(c)]
+
+        fetched = {}
+        # 进程级共享线程池；实际并发由各行情源的 SourceGuard 按错误率自适应控制
+        executor = UpstreamClient.executor(prefetch)
+        etf_future = executor.submit(cls.get_etf_quotes_sina, etf_codes, prefetch) if etf_codes else None
+        for code, quote in executor.map(lambda c: cls.get_otc_quote_tiantian(c, prefetch), otc_codes):
+            # 只有当抓取成功且数据体不为 None 时才存入
+            if quote:
+                fetched[code] = quote
+        if etf_future:
+            fetched.update(etf_future.result())
+        # 记录抓取时间，用于判断休市后这条行情是否仍是最新值
+        now = time.time()
+        for quote in fetched.values():
+            quote['_ts'] = now
+        return fetched
+
+    @classmethod
+    def quote_feed(cls):
+        """行情更新推送源 (预取任务发布到这里)"""
+        return cls._snapshot
+
+    @classmethod
+    def cache_stats(cls):
+        """行情缓存命中统计，用于评估缓存容量"""
+        stats = cls._cache.stats()
+        stats["coalesced"] = cls._inflight.shared
+        stats["sources"] = UpstreamClient.guard_stats()
+        return stats
+
     @classmethod
     def get_single_quote(cls, code):
-        # 路由分发
-        if cls.is_exchange_traded(code):
-            return cls.get_etf_quote_sina(code) # 走新浪/腾讯
-        return cls.get_otc_quote_tiantian(code) # 走天天基金
+        # 路由分发 (场内走新浪/腾讯，场外走天天基金) 在 _fetch_upstream 里完成
+        return cls.get_fund_quote(code)
     
+    # 新浪行情接口单次请求最多拼接的代码数量
+    SINA_BATCH_SIZE = 50
+    _SINA_LINE_RE = re.compile(r'var hq_str_(?:sh|sz)(\d{6})="([^"]*)"')
+
+    @staticmethod
+    def _sina_symbol(code):
+        # 新浪接口：sz+代码 或 sh+代码
+        return f"sz{code}" if code.startswith(('1', '15')) else f"sh{code}"
+
     @classmethod
     def get_etf_quote_sina(cls, code):
         """🛡️ 新浪财经接口：支持场内 ETF 基金"""
-        try:
-            # 新浪接口：sz+代码 或 sh+代码
-            symbol = f"sz{code}" if code.startswith(('1', '15')) else f"sh{code}"
-            url = f"http://hq.sinajs.cn/list={symbol}"
-            
-            # 注意：新浪接口可能需要特定的 Referer
-            headers = {"Referer": "http://finance.sina.com.cn"}
-            resp = requests.get(url, headers=headers, timeout=3)
-            
-            # 解析数据：var hq_str_sz159586="...,现价,昨日收盘,..."
-            content = resp.text
-            if len(content) < 50: return code, None
-            
-            data = content.split('=')[1].split(',')
-            name = data[0].strip('"')
-            curr = float(data[3]) # 当前价
-            yest = float(data[2]) # 昨收
-            
-            return code, {
+        return code, cls.get_etf_quotes_sina([code]).get(code)
+
+    @classmethod
+    def get_etf_quotes_sina(cls, codes, prefetch=False):
+        """
+        🚀 新浪批量行情：list= 支持逗号拼接多个代码，按 SINA_BATCH_SIZE 分块请求
+        返回 {code: quote}，解析失败的代码不出现在结果里
+        """
+        results = {}
+        guard = UpstreamClient.guard('sina', prefetch)
+        for i in range(0, len(codes), cls.SINA_BATCH_SIZE):
+            chunk = codes[i:i + cls.SINA_BATCH_SIZE]
+            # 熔断中或限速拿不到令牌：直接放弃，由调用方走缓存兜底
+            if not guard.acquire():
+                continue
+            outcome = 'error'
+            try:
+                url = "http://hq.sinajs.cn/list=" + ",".join(cls._sina_symbol(c) for c in chunk)
+                # 注意：新浪接口可能需要特定的 Referer
+                headers = {"Referer": "http://finance.sina.com.cn"}
+                resp = UpstreamClient.get(url, headers=headers)
+                if resp.status_code in cls._BAN_STATUS:
+                    outcome = 'ban'
+                    logger.error(f"新浪行情接口拒绝访问 ({resp.status_code}): {chunk}")
+                    continue
+                resp.encoding = 'gbk'
+                results.update(cls._parse_sina_response(resp.text))
+                outcome = 'ok' if resp.status_code == 200 else 'error'
+            except Exception as e:
+                logger.error(f"⚠️ 新浪行情接口异常 {chunk}: {str(e)}")
+            finally:
+                guard.release(outcome)
+        return results
+
+    @classmethod
+    def _parse_sina_response(cls, content):
+        """解析多行 var hq_str_sz159586="名称,今开,昨收,现价,..." 格式"""
+        results = {}
+        for code, body in cls._SINA_LINE_RE.findall(content):
+            data = body.split(',')
+            if len(data) < 4:
+                continue  # 代码不存在时返回空字符串
+            try:
+                name = data[0]
+                yest = float(data[2])  # 昨收
+                curr = float(data[3])  # 当前价
+            except ValueError:
+                continue
+            # 开盘前现价为 0，按昨收处理，避免算出 -100% 的涨跌幅
+            if curr <= 0:
+                curr = yest
+
+            results[code] = {
                 "code": code,
                 "name": name,
                 "nav": yest,
@@ -135,8 +467,7 @@ class MarketService:
                 "gszzl": round((curr - yest) / yest * 100, 2) if yest > 0 else 0,
                 "source": "sina_etf"
             }
-        except:
-            return code, None
+        return results
         
     @classmethod
     def is_exchange_traded(cls, code):
@@ -155,31 +486,39 @@ class MarketService:
     
     @classmethod
     def get_fund_quote(cls, code):
-        # 1. 判断路由
-        if cls.is_exchange_traded(code):
-            # 场内基金：走新浪/腾讯接口，获取实时交易价格
-            return cls.get_etf_quote_sina(code)
-        else:
-            # 场外基金：走天天基金接口，获取实时估值
-            return cls.get_otc_quote_tiantian(code)
+        # 场内基金：走新浪/腾讯接口，获取实时交易价格
+        # 场外基金：走天天基金接口，获取实时估值
+        # 同一代码已有在途请求时直接等待其结果，不重复请求上游
+        return code, cls._fetch_quotes([code]).get(code)
 
     @classmethod
-    def get_otc_quote_tiantian(cls, code):
+    def get_otc_quote_tiantian(cls, code, prefetch=False):
         """原有天天基金逻辑，增加内容校验防止解析 HTML 报错"""
+        # 🛡️ 熔断中或限速拿不到令牌：直接失败，由调用方走缓存兜底
+        guard = UpstreamClient.guard('tiantian', prefetch)
+        if not guard.acquire():
+            return code, None
+        outcome = 'error'
         try:                      
             ts = int(time.time() * 1000)
             url = f"http://fundgz.1234567.com.cn/js/{code}.js?rt={ts}"
             
-            resp = requests.get(url, headers=cls._HEADERS, timeout=5)
+            resp = UpstreamClient.get(url, headers=cls._HEADERS)
             # 🛡️ 关键：先检查是否为有效 JS 内容，防止被封 IP 返回 HTML 导致报错
             if not resp.text.startswith('jsonpgz'):
-                logger.error(f"天天基金接口返回异常内容: {code}")
+                # 只有 403/429 或 200 返回的反爬 HTML 页才算封禁 (直接熔断)；
+                # 单个代码 404、偶发 502 等按普通失败计数，累计到 failure_threshold 才熔断
+                if resp.status_code in cls._BAN_STATUS or (resp.status_code == 200 and resp.text.lstrip().startswith('<')):
+                    outcome = 'ban'
+                logger.error(f"天天基金接口返回异常内容 ({resp.status_code}): {code}")
                 return code, None
             # 解析 jsonpgz(...) 格式
             match = re.search(r'jsonpgz\((.*)\);', resp.text)
             
-            if not match:
+            if not match or not match.group(1):
+                # 接口正常响应，只是代码不存在，不算行情源故障
                 logger.warning(f"无法解析基金代码或代码不存在: {code}")
+                outcome = 'ok'
                 return code, None
 
             # 这里的 json.loads 必须配对正确
@@ -196,6 +535,7 @@ class MarketService:
             gsz = float(raw_gsz) if raw_gsz else nav # 非交易时间估值通常等于净值
             pct = float(raw_pct) if raw_pct else 0.0
 
+            outcome = 'ok'
             return code, {
                 "code": code,
                 "name": data.get('name'),
@@ -207,4 +547,6 @@ class MarketService:
             }
         except Exception as e:
             logger.error(f"⚠️ 天天基金接口异常 {code}: {str(e)}")
-            return code, None
\ No newline at end of file
+            return code, None
+        finally:
+            guard.release(outcome)
\ No newline at end of file
@@ -0,0 +1,162 @@
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from config import Config
+from .. import db
+from ..models import OcrJob
+from .wechat_ocr import WeChatOCRService
+
+logger = logging.getLogger(__name__)
+
+
+class OcrQueueFull(Exception):
+    pass
+
+
+class OcrJobService:
+    """
+    📸 截图识别异步任务
+    - 提交只写一行 ocr_jobs 并返回任务 id，请求线程不再等待换链接 / 下载 / OCR (最长 20s+)
+    - 每个进程一个有界线程池 (OCR_WORKERS) 执行识别，排队 + 执行中的任务超过 OCR_QUEUE_MAX 时拒绝提交
+    - 任务状态、当前阶段、结果与各阶段耗时都写回 ocr_jobs，轮询请求落到任何 worker 都能查到
+    """
+    _executor = None
+    _lock = threading.Lock()
+    _queued = 0
+    _running = 0
+    # 阶段名 -> [次数, 总毫秒, 最大毫秒] (本进程)
+    _stage_stats = {}
+
+    @classmethod
+    def executor(cls):
+        """gunicorn fork 之后首次提交时才创建线程池"""
+        if cls._executor is None:
+            with cls._lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=Config.OCR_WORKERS,
+                        thread_name_prefix='ocr'
+                    )
+        return cls._executor
+
+    @classmethod
+    def submit(cls, user_id, file_id):
+        """创建任务并放进线程池，返回任务对象；队列已满时抛出 OcrQueueFull"""
+        with cls._lock:
+            if cls._queued + cls._running >= Config.OCR_QUEUE_MAX:
+                raise OcrQueueFull("识别排队人数较多，请稍后再试")
+            cls._queued += 1
+
+        try:
+            job = OcrJob(id=uuid.uuid4().hex, user_id=user_id, file_id=file_id, status='queued')
+            db.session.add(job)
+            db.session.commit()
+            cls.executor().submit(cls._run, current_app._get_current_object(), job.id, file_id, time.time())
+        except Exception:
+            with cls._lock:
+                cls._queued -= 1
+            raise
+        return job
+
+    @classmethod
+    def _run(cls, app, job_id, file_id, submitted_at):
+        with cls._lock:
+            cls._queued -= 1
+            cls._running += 1
+        timings = {"queue": round((time.time() - submitted_at) * 1000)}
+        current = {"stage": None, "started": time.time()}
+
+        def finish_stage():
+            if current["stage"]:
+                elapsed = round((time.time() - current["started"]) * 1000)
+                timings[current["stage"]] = elapsed
+                cls._record(current["stage"], elapsed)
+
+        def on_stage(stage):
+            finish_stage()
+            current["stage"], current["started"] = stage, time.time()
+            cls._update(job_id, stage=stage)
+
+        started_at = time.time()
+        with app.app_context():
+            try:
+                cls._update(job_id, status='running')
+                result = WeChatOCRService.recognize_by_fileid(file_id, on_stage=on_stage)
+                finish_stage()
+                timings["total"] = round((time.time() - started_at) * 1000)
+                cls._update(job_id, status='done', result=json.dumps(result, ensure_ascii=False),
+                            timings=json.dumps(timings))
+                logger.info(f"✅ OCR 任务 {job_id} 完成: {len(result)} 条, 耗时 {timings}")
+            except Exception as e:
+                finish_stage()
+                timings["total"] = round((time.time() - started_at) * 1000)
+                logger.warning(f"❌ OCR 任务 {job_id} 失败 (阶段 {current['stage']}): {str(e)}")
+                try:
+                    cls._update(job_id, status='failed', error=str(e)[:255], timings=json.dumps(timings))
+                except Exception:
+                    logger.exception(f"❌ OCR 任务 {job_id} 状态写回失败")
+            finally:
+                db.session.remove()
+                with cls._lock:
+                    cls._running -= 1
+
+    @staticmethod
+    def _update(job_id, **values):
+        try:
+            db.session.query(OcrJob).filter_by(id=job_id).update(values)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    @classmethod
+    def _record(cls, stage, elapsed_ms):
+        with cls._lock:
+            entry = cls._stage_stats.setdefault(stage, [0, 0, 0])
+            entry[0] += 1
+            entry[1] += elapsed_ms
+            entry[2] = max(entry[2], elapsed_ms)
+
+    @staticmethod
+    def get(job_id, user_id):
+        """只返回该用户自己的任务"""
+        return db.session.query(OcrJob).filter_by(id=job_id, user_id=user_id).first()
+
+    @classmethod
+    def purge(cls):
+        """
+        定时任务 (leader)：超过 OCR_JOB_STALE_SECONDS 仍未结束的任务 (执行进程已退出) 标记为失败，
+        删除超过 OCR_JOB_RETENTION 秒的旧任务；返回 (标记失败数, 删除数)
+        """
+        now = datetime.utcnow()
+        stale = db.session.query(OcrJob).filter(
+            OcrJob.status.in_(('queued', 'running')),
+            OcrJob.created_at < now - timedelta(seconds=Config.OCR_JOB_STALE_SECONDS)
+        ).update({"status": 'failed', "error": '任务执行超时，请重新上传'}, synchronize_session=False)
+        deleted = db.session.query(OcrJob).filter(
+            OcrJob.created_at < now - timedelta(seconds=Config.OCR_JOB_RETENTION)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return stale, deleted
+
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            stages = {
+                stage: {"count": count, "avg_ms": round(total / count), "max_ms": max_ms}
+                for stage, (count, total, max_ms) in cls._stage_stats.items()
+            }
+            return {
+                "workers": Config.OCR_WORKERS,
+                "queue_max": Config.OCR_QUEUE_MAX,
+                "queued": cls._queued,
+                "running": cls._running,
+                "stages": stages,
+            }
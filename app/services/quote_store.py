@@ -0,0 +1,109 @@
+import threading
+import logging
+from datetime import datetime, timedelta, timezone
+
+from .. import db
+from ..models import FundQuote
+
+logger = logging.getLogger(__name__)
+
+
+class QuoteStore:
+    """
+    💾 最近一次成功行情的持久化 (fund_quotes 表)
+    - 写：请求线程只把行情放进内存缓冲区，由定时任务批量落库 (write-behind)，不拖慢热路径
+    - 读：上游失败或休市时，一条 IN 查询批量读出兜底
+    """
+    _pending = {}
+    _persisted = {}  # code -> 最近一次落库的 (nav, gsz, gszzl, gztime)，没变就不重复写
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _fingerprint(quote):
+        return quote.get('nav'), quote.get('gsz'), quote.get('gszzl'), quote.get('gztime')
+
+    @classmethod
+    def stage(cls, quotes):
+        """把抓取成功的行情放进写缓冲区"""
+        if not quotes:
+            return
+        with cls._lock:
+            for code, quote in quotes.items():
+                if cls._persisted.get(code) != cls._fingerprint(quote):
+                    cls._pending[code] = quote
+
+    @classmethod
+    def flush(cls):
+        """批量落库 (需要应用上下文)，返回写入的行数"""
+        with cls._lock:
+            pending, cls._pending = cls._pending, {}
+        if not pending:
+            return 0
+
+        now = datetime.utcnow()
+        try:
+            existing = {q.code: q for q in FundQuote.query.filter(FundQuote.code.in_(list(pending))).all()}
+            for code, quote in pending.items():
+                row = existing.get(code)
+                if row is None:
+                    row = FundQuote(code=code)
+                    db.session.add(row)
+                row.name = quote.get('name') or row.name
+                row.nav = quote.get('nav')
+                row.gsz = quote.get('gsz')
+                row.gszzl = quote.get('gszzl')
+                row.gztime = quote.get('gztime')
+                row.source = quote.get('source')
+                # 记录的是抓取时间而不是落库时间，休市判断依赖它
+                row.updated_at = datetime.fromtimestamp(quote['_ts'], timezone.utc).replace(tzinfo=None) \
+                    if quote.get('_ts') else now
+            db.session.commit()
+        except Exception as e:
+            # 多进程同时插入同一代码会撞主键，放回缓冲区下次再写
+            db.session.rollback()
+            with cls._lock:
+                for code, quote in pending.items():
+                    cls._pending.setdefault(code, quote)
+            logger.warning(f"⚠️ 行情落库失败，稍后重试: {str(e)}")
+            return 0
+
+        with cls._lock:
+            for code, quote in pending.items():
+                cls._persisted[code] = cls._fingerprint(quote)
+        return len(pending)
+
+    @classmethod
+    def load_many(cls, codes, max_age=None):
+        """
+        批量读取持久化行情 (单条 IN 查询)，返回 {code: quote}
+        max_age: 只返回最近 max_age 秒内写入的行
+        """
+        if not codes:
+            return {}
+        query = FundQuote.query.filter(FundQuote.code.in_(list(codes)))
+        if max_age is not None:
+            query = query.filter(FundQuote.updated_at >= datetime.utcnow() - timedelta(seconds=max_age))
+        try:
+            return {row.code: row.to_quote() for row in query.all()}
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"⚠️ 读取持久化行情失败: {str(e)}")
+            return {}
+
+    @classmethod
+    def load_since(cls, since=None):
+        """
+        读取抓取时间晚于 since (UTC naive datetime) 的行情，保留原始行情源
+        非 leader 进程用它同步 leader 预取的结果；返回 ({code: quote}, 本批最大 updated_at)
+        """
+        query = FundQuote.query
+        if since is not None:
+            query = query.filter(FundQuote.updated_at > since)
+        quotes, latest = {}, since
+        for row in query.all():
+            quote = row.to_quote()
+            quote['source'] = row.source or quote['source']
+            quotes[row.code] = quote
+            if row.updated_at and (latest is None or row.updated_at > latest):
+                latest = row.updated_at
+        return quotes, latest
@@ -1,10 +1,12 @@
 # app/services/task_service.py
-import akshare as ak
-import json
-import os
+from datetime import datetime, timedelta
 from flask import current_app
+from config import Config
 
 class TaskService:
+    # 非 leader 进程已同步到的 fund_quotes.updated_at
+    _quote_sync_since = None
+
     @staticmethod
     def update_fund_json():
         """
@@ -12,27 +14,85 @@ class TaskService:
         """
         print("⏰ 开始执行定时任务：更新 funds.json ...")
         try:
+            # akshare / pandas 很重，只在定时任务里用到，不在启动时导入
+            import akshare as ak
+
             # 1. 拉取数据
             df = ak.fund_name_em()
             fund_map = dict(zip(df['基金简称'], df['基金代码']))
             
-            # 2. 确定路径 (指向 app/data/funds.json)
-            # 注意：在 Flask 应用上下文中，建议使用 absolute path
-            base_dir = os.path.dirname(os.path.dirname(__file__)) # 定位到 app/
-            save_path = os.path.join(base_dir, 'data', 'funds.json')
-            
-            # 确保目录存在
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            
-            # 3. 写入文件
-            with open(save_path, 'w', encoding='utf-8') as f:
-                json.dump(fund_map, f, ensure_ascii=False)
+            # 2. 发布新版本：原子替换本地 funds.json / funds.catalog，并写入数据库供其他实例同步
+            from app.services.catalog_release import CatalogRelease
+            version = CatalogRelease.publish(fund_map)
                 
-            print(f"✅ 定时任务完成：已更新 {len(fund_map)} 条基金数据")
+            print(f"✅ 定时任务完成：已更新 {len(fund_map)} 条基金数据 (版本 {version})")
             
-            # 4. 可选：更新完后，清除一下内存里的缓存 (如果有的话)
+            # 3. 清除本进程的旧名称表，并在任务线程里换上新匹配器
             from app.services.wechat_ocr import WeChatOCRService
-            WeChatOCRService._fund_map = None 
+            WeChatOCRService._fund_map = None
+            WeChatOCRService.get_matcher()
             
         except Exception as e:
-            print(f"❌ 定时任务失败: {str(e)}")
\ No newline at end of file
+            print(f"❌ 定时任务失败: {str(e)}")
+
+    @staticmethod
+    def update_trade_calendar():
+        """
+        定时任务：刷新 A 股交易日历 (节假日表)
+        """
+        from app.services.trading_calendar import TradingCalendar
+        try:
+            count = TradingCalendar.refresh()
+            print(f"✅ 交易日历已更新：{count} 个交易日")
+        except Exception as e:
+            print(f"❌ 交易日历更新失败: {str(e)}")
+
+    @staticmethod
+    def update_nav_history():
+        """
+        定时任务：增量更新所有持仓基金的历史净值
+        """
+        from app.services.history import NavHistoryService
+        ok, added = NavHistoryService.ingest_all()
+        print(f"✅ 历史净值更新完成：{ok} 只基金，新增 {added} 条")
+
+    @staticmethod
+    def refresh_held_quotes():
+        """
+        定时任务：交易时段内批量预取所有用户持有基金的行情，发布到行情快照
+        上游请求量只与不同基金代码的数量有关，与用户请求量无关
+        """
+        from app import db
+        from app.models import FundAsset
+        from app.services.market import MarketService
+        from app.services.quote_store import QuoteStore
+
+        codes = [row[0] for row in db.session.query(FundAsset.fund_code).distinct().all()]
+        db.session.remove()  # 先归还数据库连接，再去抓行情
+        count = MarketService.refresh_quotes(codes)
+        QuoteStore.flush()
+        return count, len(codes)
+
+    @classmethod
+    def sync_quotes_from_store(cls):
+        """
+        定时任务 (非 leader 进程)：把 leader 预取后落库的行情同步到本进程的快照
+        每次只读上次同步之后更新过的行；返回同步的条数
+        """
+        from app import db
+        from app.services.leader import LeaderLease
+        from app.services.market import MarketService
+        from app.services.quote_store import QuoteStore
+
+        # leader 不在时不刷新快照时间，让快照按 QUOTE_SNAPSHOT_MAX_AGE 自然过期，请求线程改走缓存/上游
+        if not LeaderLease.leader_alive():
+            db.session.remove()
+            return 0
+        since = cls._quote_sync_since
+        if since is None:
+            # 首次同步只取快照有效期内的行情：更早的行 (例如只被请求抓过、leader 不预取的代码) 不能当作当前值
+            since = datetime.utcnow() - timedelta(seconds=Config.QUOTE_SNAPSHOT_MAX_AGE)
+        quotes, cls._quote_sync_since = QuoteStore.load_since(since)
+        db.session.remove()
+        MarketService.apply_synced(quotes)
+        return len(quotes)
@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import zlib
+import logging
+import threading
+from datetime import datetime, date, timedelta, timezone, time as dtime
+
+from ..utils.helpers import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# A 股交易时段 (北京时间)
+CN_TZ = timezone(timedelta(hours=8))
+TRADING_SESSIONS = ((dtime(9, 30), dtime(11, 30)), (dtime(13, 0), dtime(15, 0)))
+# 场外基金当日净值的公布窗口：交易日晚间净值会更新，这段时间内行情仍可能变化
+OTC_NAV_WINDOW = (dtime(18, 0), dtime(23, 30))
+
+_CALENDAR_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'trade_dates.json')
+
+
+class TradingCalendar:
+    """
+    📅 A 股交易日历
+    - 交易日表来自 app/data/trade_dates.json (leader 每晚通过 akshare 刷新并发布到数据库，其他进程定时同步)
+    - 表未覆盖的日期 (文件缺失 / 超出已公布范围) 按“周一到周五”兜底
+    - MarketService 通过 can_price_change / last_change_at 判断行情是否可能变化，
+      不可能变化时直接用最近一次的值，不请求上游
+    """
+    _trade_dates = None
+    _coverage = None  # (最早日期, 最晚日期)
+    _mtime = 0
+    _checked_at = 0
+    _lock = threading.Lock()
+    # 数据库里发布的版本 (fund_catalog_releases.name)；本进程已同步到的版本
+    RELEASE_NAME = 'trade_dates'
+    _synced_version = 0
+
+    # ==========================================
+    # 交易日表
+    # ==========================================
+    @classmethod
+    def _load(cls):
+        # 每分钟最多 stat 一次文件，文件被定时任务替换后自动重新加载
+        now = time.monotonic()
+        if cls._trade_dates is not None and now - cls._checked_at < 60:
+            return
+        cls._checked_at = now
+        try:
+            mtime = os.path.getmtime(_CALENDAR_PATH)
+        except OSError:
+            return
+        if cls._trade_dates is not None and mtime == cls._mtime:
+            return
+        with cls._lock:
+            try:
+                with open(_CALENDAR_PATH, 'r', encoding='utf-8') as f:
+                    dates = {date.fromisoformat(d) for d in json.load(f)}
+            except Exception as e:
+                logger.warning(f"⚠️ 交易日历文件读取失败，按工作日兜底: {str(e)}")
+                return
+            if dates:
+                cls._trade_dates = dates
+                cls._coverage = (min(dates), max(dates))
+            cls._mtime = mtime
+
+    @classmethod
+    def _write(cls, dates):
+        # 同一台机器上多个 worker 可能同时写：各用各的临时文件，再原子替换
+        atomic_write(_CALENDAR_PATH, json.dumps(dates).encode('utf-8'))
+        cls._trade_dates = None
+        cls._mtime = 0
+        cls._load()
+
+    @classmethod
+    def refresh(cls):
+        """拉取交易日历，写入 trade_dates.json 并发布到数据库 (leader 定时任务调用，需要应用上下文)，返回交易日数量"""
+        import akshare as ak
+        df = ak.tool_trade_date_hist_sina()
+        dates = sorted(str(d)[:10] for d in df['trade_date'])
+        cls._write(dates)
+        cls._synced_version = cls.publish(dates)
+        return len(dates)
+
+    @classmethod
+    def publish(cls, dates):
+        """交易日表写入 fund_catalog_releases (与基金目录同一张表)，返回版本号"""
+        from .. import db
+        from ..models import FundCatalogRelease
+        version = int(time.time() * 1000)
+        row = db.session.get(FundCatalogRelease, cls.RELEASE_NAME)
+        if row is None:
+            row = FundCatalogRelease(name=cls.RELEASE_NAME)
+            db.session.add(row)
+        row.version, row.count = version, len(dates)
+        row.payload = zlib.compress(json.dumps(dates).encode('utf-8'))
+        db.session.commit()
+        return version
+
+    @classmethod
+    def sync(cls):
+        """
+        所有进程定时调用 (需要应用上下文)：已发布的交易日表比本进程同步过的新时，下载写入本地文件
+        trade_dates.json 不随镜像发布，新扩容的容器也靠它拿到节假日表；返回是否写入了文件
+        """
+        from .. import db
+        from ..models import FundCatalogRelease
+        from .leader import LeaderLease
+
+        version = db.session.query(FundCatalogRelease.version).filter_by(name=cls.RELEASE_NAME).scalar() or 0
+        if not version:
+            # 还没有发布过 (首次部署)：由 leader 直接拉取并发布，不必等到凌晨的定时任务
+            if LeaderLease.is_leader() and not os.path.exists(_CALENDAR_PATH):
+                cls.refresh()
+                return True
+            return False
+        if version <= cls._synced_version:
+            return False
+
+        row = db.session.get(FundCatalogRelease, cls.RELEASE_NAME)
+        dates = json.loads(zlib.decompress(row.payload).decode('utf-8'))
+        cls._synced_version = row.version
+        cls._load()
+        if cls._trade_dates == {date.fromisoformat(d) for d in dates}:
+            return False
+        cls._write(dates)
+        logger.info(f"📅 交易日历已同步到版本 {row.version} ({len(dates)} 个交易日)")
+        return True
+
+    @classmethod
+    def is_trading_day(cls, d):
+        cls._load()
+        if cls._trade_dates is not None and cls._coverage[0] <= d <= cls._coverage[1]:
+            return d in cls._trade_dates
+        return d.weekday() < 5
+
+    # ==========================================
+    # 交易时段
+    # ==========================================
+    @staticmethod
+    def now():
+        return datetime.now(CN_TZ)
+
+    @classmethod
+    def is_open(cls, now=None):
+        """当前是否处于连续竞价时段 (已排除周末与节假日)"""
+        now = now or cls.now()
+        if not cls.is_trading_day(now.date()):
+            return False
+        t = now.time()
+        return any(start <= t < end for start, end in TRADING_SESSIONS)
+
+    @classmethod
+    def _in_nav_window(cls, now):
+        start, end = OTC_NAV_WINDOW
+        return cls.is_trading_day(now.date()) and start <= now.time() < end
+
+    @classmethod
+    def next_open(cls, now=None):
+        """下一个交易时段的开始时间 (午休期间为 13:00)"""
+        now = now or cls.now()
+        for day in range(30):
+            d = now.date() + timedelta(days=day)
+            if not cls.is_trading_day(d):
+                continue
+            for start, _ in TRADING_SESSIONS:
+                open_at = datetime.combine(d, start, tzinfo=CN_TZ)
+                if open_at > now:
+                    return open_at
+        return now
+
+    @classmethod
+    def last_close(cls, now=None):
+        """最近一个已经结束的交易时段的结束时间 (午休期间为 11:30)"""
+        now = now or cls.now()
+        for day in range(30):
+            d = now.date() - timedelta(days=day)
+            if not cls.is_trading_day(d):
+                continue
+            for _, end in reversed(TRADING_SESSIONS):
+                close_at = datetime.combine(d, end, tzinfo=CN_TZ)
+                if close_at <= now:
+                    return close_at
+        return now
+
+    @classmethod
+    def seconds_until_next_open(cls, now=None):
+        now = now or cls.now()
+        return max((cls.next_open(now) - now).total_seconds(), 0)
+
+    # ==========================================
+    # 行情是否可能变化
+    # ==========================================
+    @classmethod
+    def can_price_change(cls, code, now=None):
+        """
+        该代码此刻的行情是否可能变化
+        - 场内基金：只在交易时段内变化
+        - 场外基金：交易时段内估值变化，交易日晚间公布当日净值
+        """
+        from .market import MarketService
+        now = now or cls.now()
+        if cls.is_open(now):
+            return True
+        return not MarketService.is_exchange_traded(code) and cls._in_nav_window(now)
+
+    @classmethod
+    def last_change_at(cls, code, now=None):
+        """
+        该代码行情最后一次可能发生变化的时间戳；在此之后抓到的值就是当前值
+        """
+        from .market import MarketService
+        now = now or cls.now()
+        if cls.can_price_change(code, now):
+            return now.timestamp()
+        changed = cls.last_close(now)
+        if not MarketService.is_exchange_traded(code):
+            # 场外基金：最近一个已经结束的净值公布窗口也算一次变化
+            for day in range(30):
+                d = now.date() - timedelta(days=day)
+                window_end = datetime.combine(d, OTC_NAV_WINDOW[1], tzinfo=CN_TZ)
+                if window_end <= now and cls.is_trading_day(d):
+                    changed = max(changed, window_end)
+                    break
+        return changed.timestamp()
@@ -0,0 +1,251 @@
+import time
+import threading
+import logging
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """令牌桶限速：rate 个/秒，最多积攒 burst 个"""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, max_wait=0):
+        """取一个令牌，最多等待 max_wait 秒；拿不到返回 False"""
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class SourceGuard:
+    """
+    🛡️ 单个行情源的保护器：令牌桶限速 + 熔断 + 自适应并发 (AIMD)
+    - 熔断：连续失败达到阈值，或识别到封禁页面时立即打开；打开期间直接失败，由调用方走缓存兜底
+    - 打开 open_seconds 后放行一个探测请求 (半开)，成功则恢复，失败则加倍打开时长
+    - 并发：成功时缓慢提升并发上限，失败时减半，上限不超过 max_concurrency
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name, rate, burst, max_concurrency, min_concurrency=1,
+                 failure_threshold=5, open_seconds=60, max_open_seconds=600, max_wait=2):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.failure_threshold = failure_threshold
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.max_wait = max_wait
+
+        self.state = self.CLOSED
+        self.limit = float(max_concurrency)
+        self._open_seconds = open_seconds
+        self._opened_at = 0
+        self._failures = 0
+        self._active = 0
+        self._cond = threading.Condition()
+        self.counters = {"ok": 0, "error": 0, "ban": 0, "rejected": 0}
+        # 同一行情源的其他保护器 (请求 / 预取各一个)：封禁针对的是 IP，识别到时一起熔断
+        self.peers = []
+
+    def _allow(self, now):
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and now - self._opened_at >= self._open_seconds:
+            self.state = self.HALF_OPEN
+            return True
+        # 半开状态下同一时间只放行一个探测请求
+        return self.state == self.HALF_OPEN and self._active == 0
+
+    def acquire(self):
+        """成功返回 True，调用方必须在请求结束后调用 release()"""
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            while True:
+                if not self._allow(time.time()):
+                    self.counters["rejected"] += 1
+                    return False
+                if self._active < int(self.limit):
+                    self._active += 1
+                    break
+                remain = deadline - time.monotonic()
+                if remain <= 0 or not self._cond.wait(remain):
+                    self.counters["rejected"] += 1
+                    return False
+        if not self.bucket.take(max(deadline - time.monotonic(), 0)):
+            self.release('rejected')
+            return False
+        return True
+
+    def release(self, outcome):
+        """outcome: 'ok' | 'error' | 'ban' | 'rejected' (未真正发出请求)"""
+        with self._cond:
+            self._active -= 1
+            if outcome == 'ok':
+                self._failures = 0
+                if self.state != self.CLOSED:
+                    logger.info(f"✅ 行情源 {self.name} 熔断恢复")
+                self.state = self.CLOSED
+                self._open_seconds = self.base_open_seconds
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            elif outcome in ('error', 'ban'):
+                self._failures += 1
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                if outcome == 'ban' or self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                    self._trip(outcome)
+            if outcome in self.counters:
+                self.counters[outcome] += 1
+            self._cond.notify_all()
+        if outcome == 'ban':
+            for peer in self.peers:
+                peer.trip(f"ban ({self.name})")
+
+    def trip(self, reason):
+        """外部触发熔断 (同一行情源的另一个保护器识别到封禁)"""
+        with self._cond:
+            if self.state != self.OPEN:
+                self._trip(reason)
+            self._cond.notify_all()
+
+    def _trip(self, reason):
+        if self.state == self.HALF_OPEN:
+            self._open_seconds = min(self._open_seconds * 2, self.max_open_seconds)
+        self.state = self.OPEN
+        self._opened_at = time.time()
+        logger.warning(f"🚫 行情源 {self.name} 熔断 {self._open_seconds}s (原因: {reason}, 连续失败 {self._failures})")
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "concurrency_limit": round(self.limit, 2),
+            "active": self._active,
+            **self.counters
+        }
+
+
+class UpstreamClient:
+    """
+    🌐 上游 HTTP 客户端：按 host 复用 keep-alive 连接池
+    - 每个 host 一个 requests.Session，连接池大小按 gunicorn 线程数 + 并发抓取线程数配置
+    - 超时与重试策略来自 Config.UPSTREAM_HOSTS，未配置的 host 使用 'default'
+    - 提供进程级共享线程池，避免每次批量抓取都新建/销毁 ThreadPoolExecutor
+    """
+    _sessions = {}
+    _guards = {}
+    _executor = None
+    _prefetch_executor = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _policy(host):
+        hosts = Config.UPSTREAM_HOSTS
+        return hosts.get(host) or hosts['default']
+
+    @classmethod
+    def session(cls, host):
+        sess = cls._sessions.get(host)
+        if sess is not None:
+            return sess
+        with cls._lock:
+            sess = cls._sessions.get(host)
+            if sess is None:
+                retries = cls._policy(host).get('retries', 0)
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=Config.UPSTREAM_POOL_SIZE,
+                    pool_block=False,
+                    max_retries=Retry(
+                        total=retries, read=0, backoff_factor=0.2,
+                        status_forcelist=(502, 503, 504),
+                        allowed_methods=frozenset(['GET']),
+                        raise_on_status=False
+                    )
+                )
+                sess = requests.Session()
+                sess.mount('http://', adapter)
+                sess.mount('https://', adapter)
+                cls._sessions[host] = sess
+        return sess
+
+    @classmethod
+    def request(cls, method, url, **kwargs):
+        host = urlsplit(url).hostname or ''
+        kwargs.setdefault('timeout', cls._policy(host).get('timeout', 10))
+        return cls.session(host).request(method, url, **kwargs)
+
+    @classmethod
+    def get(cls, url, **kwargs):
+        return cls.request('GET', url, **kwargs)
+
+    @classmethod
+    def post(cls, url, **kwargs):
+        return cls.request('POST', url, **kwargs)
+
+    @classmethod
+    def executor(cls, prefetch=False):
+        """
+        进程级共享线程池 (gunicorn fork 之后首次使用时才创建)
+        prefetch=True 返回预取任务专用的线程池，预取再久也不占请求路径的抓取线程
+        """
+        if prefetch:
+            if cls._prefetch_executor is None:
+                with cls._lock:
+                    if cls._prefetch_executor is None:
+                        cls._prefetch_executor = ThreadPoolExecutor(
+                            max_workers=Config.UPSTREAM_PREFETCH_WORKERS,
+                            thread_name_prefix='prefetch'
+                        )
+            return cls._prefetch_executor
+        if cls._executor is None:
+            with cls._lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=Config.UPSTREAM_EXECUTOR_WORKERS,
+                        thread_name_prefix='upstream'
+                    )
+        return cls._executor
+
+    @classmethod
+    def guard(cls, source, prefetch=False):
+        """
+        按行情源名称获取限速/熔断保护器：请求路径用 Config.UPSTREAM_SOURCES，
+        prefetch=True 用预取专用的 Config.UPSTREAM_PREFETCH_SOURCES (令牌桶与并发各自独立，封禁时一起熔断)
+        """
+        key = f"{source}:prefetch" if prefetch else source
+        guard = cls._guards.get(key)
+        if guard is None:
+            with cls._lock:
+                if source not in cls._guards:
+                    main = SourceGuard(source, **Config.UPSTREAM_SOURCES[source])
+                    pre = SourceGuard(f"{source}:prefetch", **Config.UPSTREAM_PREFETCH_SOURCES[source])
+                    main.peers, pre.peers = [pre], [main]
+                    cls._guards[main.name], cls._guards[pre.name] = main, pre
+                guard = cls._guards[key]
+        return guard
+
+    @classmethod
+    def guard_stats(cls):
+        return {name: guard.stats() for name, guard in cls._guards.items()}
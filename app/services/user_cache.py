@@ -0,0 +1,98 @@
+import time
+import threading
+
+from flask import g, has_request_context
+from sqlalchemy import select, update
+
+from config import Config
+from .. import db
+from ..models import User
+from ..utils.cache import TTLCache, SharedTier
+
+
+class UserCache:
+    """
+    👤 按用户缓存的派生数据 (持仓汇总、持仓列表等)
+    - 本进程内：写接口提交后调用 invalidate(user_id) 立即失效该用户的所有 UserCache
+    - 跨进程：失效时写入该用户的代次号 (generation)，其他进程读缓存前比对代次号
+      配置了 Redis 时每个请求直接读 Redis；未配置时代次号存 users.holdings_version，
+      由 sync_generations 定时批量拉取最近变化的用户，请求路径上不查库 (其他进程最多晚一个同步周期看到变化)
+    """
+    _instances = []
+    _written = TTLCache(maxsize=10000)  # user_id -> 本进程最近一次写入时间
+    _generations = SharedTier(getattr(Config, 'REDIS_URL', None), prefix='jidong:usergen')
+    _known = TTLCache(maxsize=100000)   # user_id -> 从数据库同步到的代次号 (未配置 Redis 时使用)
+    _lock = threading.Lock()
+
+    def __init__(self, name, maxsize=2000, ttl=60):
+        self.name = name
+        self.ttl = ttl
+        self._local = TTLCache(maxsize=maxsize)
+        with UserCache._lock:
+            UserCache._instances.append(self)
+
+    @classmethod
+    def _generation(cls, user_id):
+        if not cls._generations.enabled:
+            return cls._known.get(user_id, 0)
+        # 同一请求内复用：先读代次号再查库，之后别的进程再失效时代次号一定不同
+        seen = g.setdefault('user_generations', {}) if has_request_context() else {}
+        if user_id not in seen:
+            seen[user_id] = cls._generations.get_many([str(user_id)]).get(str(user_id), 0)
+        return seen[user_id]
+
+    @classmethod
+    def sync_generations(cls):
+        """
+        定时任务 (所有进程，未配置 Redis 时)：拉取最近 USER_GENERATION_LOOKBACK 秒内写过持仓的用户的代次号
+        代次号是各机器的本地时间，回看窗口同时容忍机器间的时钟偏差；返回代次号有变化的用户数
+        """
+        since = time.time_ns() - Config.USER_GENERATION_LOOKBACK * 10 ** 9
+        rows = db.session.execute(
+            select(User.id, User.holdings_version).where(User.holdings_version > since)
+        ).all()
+        db.session.remove()
+        changed = 0
+        for user_id, gen in rows:
+            if cls._known.get(user_id, 0) != gen:
+                cls._known.set(user_id, gen, 86400)
+                changed += 1
+        return changed
+
+    def get(self, user_id):
+        gen = self._generation(user_id)
+        entry = self._local.get(user_id)
+        if entry is None:
+            return None
+        cached_gen, value = entry
+        if cached_gen != gen:
+            self._local.delete(user_id)
+            return None
+        return value
+
+    def set(self, user_id, value):
+        self._local.set(user_id, (self._generation(user_id), value), self.ttl)
+
+    @classmethod
+    def invalidate(cls, user_id):
+        """该用户的持仓发生变化 (写接口提交之后调用)：清掉所有 UserCache 中该用户的条目，并更新代次号"""
+        for cache in cls._instances:
+            cache._local.delete(user_id)
+        now_ns = time.time_ns()
+        cls._written.set(user_id, now_ns, 3600)
+        cls._known.set(user_id, now_ns, 86400)
+        if has_request_context():
+            g.setdefault('user_generations', {})[user_id] = now_ns
+        # 数据库里的代次号总是更新：Redis 暂时不可用而降级时，各进程仍能比对到最新值
+        db.session.execute(update(User).where(User.id == user_id).values(holdings_version=now_ns))
+        db.session.commit()
+        cls._generations.set_many({str(user_id): now_ns}, ttl=86400)
+
+    @classmethod
+    def written_within(cls, user_id, seconds):
+        """该用户最近 seconds 秒内是否写过持仓 (任意进程)"""
+        written_ns = cls._written.get(user_id) or cls._generation(user_id)
+        return bool(written_ns) and time.time_ns() - written_ns < seconds * 1e9
+
+    def stats(self):
+        return self._local.stats()
@@ -0,0 +1,105 @@
+import numpy as np
+
+
+class ValuationEngine:
+    """
+    🧮 持仓估值引擎 (NumPy 向量化)：/list、/quotes、推送流与批处理任务共用一套计算与兜底规则
+    兜底规则：
+    - 昨日净值 nav：接口净值 > 接口估值 > 持仓成本价 > 1.0
+    - 当前估值 gsz：接口估值 > 昨日净值
+    - 成本价 cost：持仓成本价 > 昨日净值 (没有成本时总收益为 0)
+    """
+
+    @staticmethod
+    def _column(quotes, codes, key):
+        return np.array([float((quotes.get(c) or {}).get(key) or 0) for c in codes], dtype=np.float64)
+
+    @classmethod
+    def compute(cls, codes, shares, costs, quotes):
+        """
+        codes/shares/costs 为等长序列 (shares、costs 允许 None)，quotes 为 {code: 原始行情}
+        返回 dict[str, np.ndarray]：nav, gsz, gszzl, market_value, day_profit, total_profit, cost_total, yield_rate
+        """
+        shares = np.array([float(s or 0) for s in shares], dtype=np.float64)
+        costs = np.array([float(c or 0) for c in costs], dtype=np.float64)
+        raw_nav = cls._column(quotes, codes, 'nav')
+        raw_gsz = cls._column(quotes, codes, 'gsz')
+        pct = cls._column(quotes, codes, 'gszzl')
+
+        nav = np.where(raw_nav > 0, raw_nav, np.where(raw_gsz > 0, raw_gsz, np.where(costs > 0, costs, 1.0)))
+        gsz = np.where(raw_gsz > 0, raw_gsz, nav)
+        cost = np.where(costs > 0, costs, nav)
+
+        # 市值 = 份额 * 当前估值(或现价)
+        mv = shares * gsz
+        # 当日收益 = (份额 * 昨日净值) * 当日涨跌幅
+        dp = shares * nav * (pct / 100)
+        # 总收益 = 当前总市值 - 总本金
+        cost_total = shares * cost
+        tp = mv - cost_total
+        # 收益率，与 helpers.calculate_yield 一致：本金为 0 时记 0
+        yield_rate = np.divide(tp * 100, cost_total, out=np.zeros_like(tp), where=cost_total != 0)
+
+        return {
+            "nav": nav,
+            "gsz": gsz,
+            "gszzl": pct,
+            "market_value": mv,
+            "day_profit": dp,
+            "total_profit": tp,
+            "cost_total": cost_total,
+            "yield_rate": yield_rate,
+        }
+
+    @classmethod
+    def rows(cls, codes, shares, costs, quotes):
+        """compute 的结果按行展开成 dict 列表 (已按接口精度四舍五入)，便于直接 jsonify"""
+        if not len(codes):
+            return []
+        res = cls.compute(codes, shares, costs, quotes)
+        cols = {
+            "nav": np.round(res["nav"], 4).tolist(),
+            "gsz": np.round(res["gsz"], 4).tolist(),
+            "gszzl": np.round(res["gszzl"], 2).tolist(),
+            "market_value": np.round(res["market_value"], 2).tolist(),
+            "day_profit": np.round(res["day_profit"], 2).tolist(),
+            "total_profit": np.round(res["total_profit"], 2).tolist(),
+            "yield_rate": np.round(res["yield_rate"], 2).tolist(),
+        }
+        return [{k: v[i] for k, v in cols.items()} for i in range(len(codes))]
+
+    @classmethod
+    def aggregate(cls, group_index, n_groups, codes, shares, costs, quotes):
+        """
+        按分组汇总 (一次 compute + np.bincount)
+        group_index 为每条持仓所属分组的下标 (0 ~ n_groups-1)
+        返回长度为 n_groups 的 dict 列表：count, market_value, day_profit, total_profit, yield_rate
+        """
+        idx = np.asarray(group_index, dtype=np.intp)
+        if not len(codes):
+            sums = {k: np.zeros(n_groups) for k in ("market_value", "day_profit", "total_profit", "cost_total")}
+        else:
+            res = cls.compute(codes, shares, costs, quotes)
+            sums = {k: np.bincount(idx, weights=res[k], minlength=n_groups)
+                    for k in ("market_value", "day_profit", "total_profit", "cost_total")}
+        count = np.bincount(idx, minlength=n_groups)
+        yield_rate = np.divide(sums["total_profit"] * 100, sums["cost_total"],
+                               out=np.zeros(n_groups), where=sums["cost_total"] != 0)
+        cols = {
+            "count": count.tolist(),
+            "market_value": np.round(sums["market_value"], 2).tolist(),
+            "day_profit": np.round(sums["day_profit"], 2).tolist(),
+            "total_profit": np.round(sums["total_profit"], 2).tolist(),
+            "yield_rate": np.round(yield_rate, 2).tolist(),
+        }
+        return [{k: v[i] for k, v in cols.items()} for i in range(n_groups)]
+
+    @classmethod
+    def value_positions(cls, positions, quotes):
+        """positions 为带 fund_code / holding_shares / cost_price 属性的对象 (ORM 行或持仓元组)"""
+        return cls.rows(
+            [p.fund_code for p in positions],
+            [p.holding_shares for p in positions],
+            [p.cost_price for p in positions],
+            quotes,
+        )
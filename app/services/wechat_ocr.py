@@ -1,16 +1,34 @@
-import requests
 import json
 import re
 import time
 import os
 import io
+import hashlib
+import threading
 from flask import current_app
-from thefuzz import process, fuzz
+from config import Config
+from .upstream import UpstreamClient
+from ..utils.cache import TTLCache, SharedTier
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
 
 class WeChatOCRService:
     _access_token = None
     _token_expire_time = 0
     _fund_map = None
+    _matcher = None
+    _matcher_mtime = None
+    _matcher_lock = threading.Lock()
+    # OCR 结果缓存：file_id -> 图片 SHA-256 | SHA-256 -> 原始文字块 | SHA-256 -> (基金目录版本, 解析结果)
+    _ocr_files = TTLCache(maxsize=Config.OCR_CACHE_SIZE)
+    _ocr_raw = TTLCache(maxsize=Config.OCR_CACHE_SIZE)
+    _ocr_parsed = TTLCache(maxsize=Config.OCR_CACHE_SIZE)
+    _ocr_shared = SharedTier(getattr(Config, 'REDIS_URL', None), prefix='jidong:ocr')
 
     # ==========================================
     # 🛡️ 1. 基础能力：Token 与 数据加载
@@ -27,7 +45,7 @@ class WeChatOCRService:
             raise Exception("未配置 WX_APPID 或 WX_SECRET")
             
         url = f"https://api.weixin.qq.com/cgi-bin/token?grant_type=client_credential&appid={appid}&secret={secret}"
-        res = requests.get(url, timeout=5, verify=False).json()
+        res = UpstreamClient.get(url, verify=False).json()
         
         if 'access_token' in res:
             cls._access_token = res['access_token']
@@ -51,13 +69,62 @@ class WeChatOCRService:
     # 📸 2. 核心识别逻辑：支持 FileID (云存储专用)
     # ==========================================
     @classmethod
-    def recognize_by_fileid(cls, file_id):
+    def recognize_by_fileid(cls, file_id, on_stage=None):
         """
         🟢 新增：根据云存储 FileID 进行识别
         流程：fileID -> 临时下载 URL -> 下载图片 -> 微信 OCR
+        同一截图重复上传时走缓存：
+        - file_id -> 图片 SHA-256：同一个 file_id 不再换链接、下载
+        - SHA-256 -> OCR 原始文字块：内容相同的图片 (重新上传得到新 file_id) 不再调 OCR
+        - SHA-256 -> 解析结果：按基金目录版本缓存，目录更新后用原始文字块重新解析
+        on_stage(阶段名) 在每个阶段开始时调用 (异步任务用来记录进度与耗时)，命中缓存跳过的阶段不会调用
         """
-        token = cls.get_access_token()
-        
+        on_stage = on_stage or (lambda stage: None)
+        digest = cls._ocr_files.get(file_id)
+        if digest is None:
+            digest = cls._ocr_shared.get_many([f"file:{file_id}"]).get(f"file:{file_id}")
+        items = cls._get_raw_items(digest) if digest else None
+
+        if items is None:
+            on_stage('token')
+            token = cls.get_access_token()
+            on_stage('download')
+            image_bytes = cls._download_file(file_id, token)
+            digest = hashlib.sha256(image_bytes).hexdigest()
+            items = cls._get_raw_items(digest)
+            if items is None:
+                on_stage('ocr')
+                items = cls._call_wechat_ocr(image_bytes, token)
+                cls._ocr_raw.set(digest, items, Config.OCR_CACHE_TTL)
+                cls._ocr_shared.set_many({f"raw:{digest}": items}, ttl=Config.OCR_CACHE_TTL)
+            cls._ocr_files.set(file_id, digest, Config.OCR_CACHE_TTL)
+            cls._ocr_shared.set_many({f"file:{file_id}": digest}, ttl=Config.OCR_CACHE_TTL)
+
+        on_stage('parse')
+        return cls._parse_cached(digest, items)
+
+    @classmethod
+    def _get_raw_items(cls, digest):
+        items = cls._ocr_raw.get(digest)
+        if items is None:
+            items = cls._ocr_shared.get_many([f"raw:{digest}"]).get(f"raw:{digest}")
+            if items is not None:
+                cls._ocr_raw.set(digest, items, Config.OCR_CACHE_TTL)
+        return items
+
+    @classmethod
+    def _parse_cached(cls, digest, items):
+        """解析结果只在本进程缓存 (解析很快)，基金目录版本变化后失效"""
+        version = cls.get_matcher().catalog.version
+        cached = cls._ocr_parsed.get(digest)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        result = cls.parse_wechat_result(items)
+        cls._ocr_parsed.set(digest, (version, result), Config.OCR_CACHE_TTL)
+        return result
+
+    @classmethod
+    def _download_file(cls, file_id, token):
         # 1. 换取临时下载链接 (微信云托管内网 API)
         download_api = f"https://api.weixin.qq.com/tcb/batchdownloadfile?access_token={token}"
         payload = {
@@ -65,7 +132,7 @@ class WeChatOCRService:
             "file_list": [{"fileid": file_id, "max_age": 7200}]
         }
         
-        res = requests.post(download_api, json=payload, timeout=5, verify=False).json()
+        res = UpstreamClient.post(download_api, json=payload, verify=False).json()
         if res.get('errcode') != 0:
             raise Exception(f"云存储换取链接失败: {res.get('errmsg')}")
             
@@ -75,38 +142,95 @@ class WeChatOCRService:
 
         # 2. 下载图片二进制流
         img_url = file_info['download_url']
-        img_resp = requests.get(img_url, timeout=10, verify=False)
-        
-        # 3. 调用微信 OCR 识别 (复用 recognize_bytes 逻辑)
-        return cls._call_wechat_ocr(img_resp.content, token)
+        return UpstreamClient.get(img_url, timeout=10, verify=False).content
 
     @classmethod
     def _call_wechat_ocr(cls, image_bytes, token):
-        """统一调用微信普通 OCR 接口"""
+        """统一调用微信普通 OCR 接口，返回原始文字块列表"""
         url = f"https://api.weixin.qq.com/cv/ocr/comm?access_token={token}"
         # 使用二进制流上传
         files = {'img': ('temp.jpg', image_bytes, 'image/jpeg')}
-        response = requests.post(url, files=files, timeout=10, verify=False)
+        response = UpstreamClient.post(url, files=files, timeout=10, verify=False)
         result = response.json()
         
         if result.get('errcode', 0) != 0:
              raise Exception(f"微信 OCR 接口报错: {result.get('errmsg')}")
-        return cls.parse_wechat_result(result.get('items', []))
+        return result.get('items', [])
+
+    @classmethod
+    def cache_stats(cls):
+        return {
+            "files": cls._ocr_files.stats(),
+            "raw": cls._ocr_raw.stats(),
+            "parsed": cls._ocr_parsed.stats(),
+            "shared": cls._ocr_shared.stats(),
+        }
 
     # ==========================================
     # 🧠 3. 算法层：模糊匹配与结果解析
     # ==========================================
     @classmethod
-    def get_match_score(cls, ocr_name):
-        fund_map = cls.load_fund_map()
-        if not fund_map: return "", 0
+    def get_matcher(cls):
+        """
+        基金名称匹配器：倒排索引随基金目录 (app/data/funds.catalog) 一起生成，各 worker 只读 mmap 共享
+        目录文件被替换 (修改时间变化) 后，下一次调用重新打开新版本
+        """
+        from .fund_catalog import CATALOG_PATH
+
+        mtime = _mtime(CATALOG_PATH)
+        if cls._matcher is not None and mtime == cls._matcher_mtime:
+            return cls._matcher
+
+        # 重建 / 重新打开只让一个线程做，其他线程等它完成后直接复用
+        with cls._matcher_lock:
+            mtime = _mtime(CATALOG_PATH)
+            if cls._matcher is not None and mtime == cls._matcher_mtime:
+                return cls._matcher
+            return cls._load_matcher(mtime)
+
+    @classmethod
+    def _load_matcher(cls, mtime):
+        # rapidfuzz 只在 OCR 时用到，首次调用才导入，不拖慢冷启动
+        from .fund_catalog import FundCatalog, CATALOG_PATH, FUND_JSON_PATH
+        from .fund_matcher import FundMatcher
+
+        json_mtime = _mtime(FUND_JSON_PATH)
+        if json_mtime and (mtime is None or mtime < json_mtime):
+            # 目录文件缺失或比 funds.json 旧 (例如只更新了 json)：从 json 重新生成
+            fund_map = cls.load_fund_map()
+            cls._fund_map = None
+            try:
+                # 版本号取 json 的修改时间：数据库里更新发布的版本仍会被同步下来
+                FundCatalog.write(fund_map, version=int(json_mtime * 1000))
+                mtime = _mtime(CATALOG_PATH)
+            except OSError:
+                cls._matcher, cls._matcher_mtime = FundMatcher(FundCatalog.from_map(fund_map)), mtime
+                return cls._matcher
+
+        catalog = FundCatalog.open(CATALOG_PATH) if mtime else FundCatalog.from_map({})
+        cls._matcher, cls._matcher_mtime = FundMatcher(catalog), mtime
+        return cls._matcher
+
+    @staticmethod
+    def _matchable(ocr_name):
         clean_name = re.sub(r'[^\u4e00-\u9fa5a-zA-Z0-9]', '', ocr_name)
-        if len(clean_name) < 2: return "", 0 
-        best_match = process.extractOne(ocr_name, fund_map.keys(), scorer=fuzz.token_sort_ratio)
-        if best_match:
-            matched_name, score = best_match
-            return fund_map[matched_name], score
-        return "", 0
+        return len(clean_name) >= 2
+
+    @classmethod
+    def get_match_score(cls, ocr_name):
+        return cls.get_match_scores([ocr_name])[0]
+
+    @classmethod
+    def get_match_scores(cls, ocr_names):
+        """一张截图的候选名称一起匹配，返回等长的 [(基金代码, 分数)]"""
+        matcher = cls.get_matcher()
+        results = [("", 0)] * len(ocr_names)
+        if not len(matcher):
+            return results
+        idx = [i for i, name in enumerate(ocr_names) if cls._matchable(name)]
+        for i, match in zip(idx, matcher.match_many([ocr_names[i] for i in idx])):
+            results[i] = match
+        return results
 
     @classmethod
     def parse_wechat_result(cls, items):
@@ -148,13 +272,12 @@ class WeChatOCRService:
 
         # 3. 智能合并与清洗
         final_list = []
-        for i in range(len(candidates)):
-            curr = candidates[i]
-            # 去除“名称”前缀干扰
-            clean_name = curr['text'].replace("名称", "").strip()
-            if len(clean_name) < 4: continue
+        # 去除“名称”前缀干扰
+        named = [(curr, curr['text'].replace("名称", "").strip()) for curr in candidates]
+        named = [(curr, clean_name) for curr, clean_name in named if len(clean_name) >= 4]
+        scores = cls.get_match_scores([clean_name for _, clean_name in named])
 
-            code, score = cls.get_match_score(clean_name)
+        for (curr, clean_name), (code, score) in zip(named, scores):
             if score > 65 and len(code) == 6:
                 amount = curr['nums'][0] if len(curr['nums']) >= 1 else 0
                 profit = curr['nums'][1] if len(curr['nums']) >= 2 else 0
@@ -0,0 +1,150 @@
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    进程内 LRU + TTL 缓存 (线程安全)
+    每个条目自带过期时间；过期条目不会立刻删除，可通过 get(..., allow_stale=True) 读出兜底
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # key -> (expire_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None, allow_stale=False):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expire_at, value = entry
+            if expire_at < now and not allow_stale:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class SharedTier:
+    """
+    可选的跨进程共享缓存层 (Redis)
+    - 未配置 url 或未安装 redis 时整体禁用，所有操作直接返回空
+    - Redis 连接异常时暂停使用 retry_after 秒，避免每个请求都去撞一个挂掉的 Redis
+    """
+
+    def __init__(self, url, prefix='jidong', retry_after=60):
+        self.url = url
+        self.prefix = prefix
+        self.retry_after = retry_after
+        self._client = None
+        self._disabled_until = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def enabled(self):
+        return bool(self.url) and time.time() >= self._disabled_until
+
+    def _key(self, key):
+        return f"{self.prefix}:{key}"
+
+    def _get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import redis
+                    self._client = redis.Redis.from_url(
+                        self.url, socket_timeout=0.5, socket_connect_timeout=0.5
+                    )
+        return self._client
+
+    def _fail(self, e):
+        self.errors += 1
+        self._disabled_until = time.time() + self.retry_after
+        logger.warning(f"⚠️ 共享缓存不可用，{self.retry_after}s 内降级为本地缓存: {str(e)}")
+
+    def get_many(self, keys):
+        """批量读取 JSON 值，返回 {key: value}，缺失的 key 不出现在结果里"""
+        if not keys or not self.enabled:
+            return {}
+        try:
+            raw = self._get_client().mget([self._key(k) for k in keys])
+        except Exception as e:
+            self._fail(e)
+            return {}
+        result = {}
+        for key, val in zip(keys, raw):
+            if val is None:
+                self.misses += 1
+                continue
+            self.hits += 1
+            result[key] = json.loads(val)
+        return result
+
+    def set_many(self, mapping, ttl):
+        if not mapping or not self.enabled:
+            return
+        try:
+            pipe = self._get_client().pipeline(transaction=False)
+            for key, value in mapping.items():
+                pipe.set(self._key(key), json.dumps(value, ensure_ascii=False), ex=max(int(ttl), 1))
+            pipe.execute()
+        except Exception as e:
+            self._fail(e)
+
+    def delete(self, key):
+        if not self.enabled:
+            return
+        try:
+            self._get_client().delete(self._key(key))
+        except Exception as e:
+            self._fail(e)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors
+        }
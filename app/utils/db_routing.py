@@ -0,0 +1,64 @@
+import sqlite3
+from functools import wraps
+
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+# SQLALCHEMY_BINDS 中从库的 key
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    """
+    🔀 读写分离 Session
+    - 只有标记了 @read_only 的接口才读从库，其余一律走主库
+    - 同一个请求里一旦有写入 (add/修改/删除/flush，或直接执行 INSERT/UPDATE/DELETE 语句)，之后的读也固定走主库，保证读己之写
+    - 未配置从库 (SQLALCHEMY_BINDS 没有 replica) 时行为与默认 Session 完全一致
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # query.update()/delete()、session.execute(insert(...)) 不经过 flush，按语句类型直接走主库
+        if isinstance(clause, UpdateBase):
+            self.info['primary'] = True
+        elif bind is None and self._use_replica():
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self):
+        if self.info.get('primary'):
+            return False
+        if self._flushing or self.new or self.dirty or self.deleted:
+            self.info['primary'] = True
+            return False
+        return has_request_context() and g.get('db_read_only', False)
+
+
+def read_only(view):
+    """只读接口：本次请求的查询走从库"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def use_primary(session):
+    """本次请求剩余的查询都走主库 (例如用户刚写过数据，从库可能还没同步)"""
+    session.info['primary'] = True
+
+
+def sync_sqlite_replica(db):
+    """本地开发：用 SQLite 在线备份把主库整库复制到从库文件"""
+    primary, replica = db.engines[None], db.engines.get(REPLICA_BIND)
+    if replica is None or primary.dialect.name != 'sqlite':
+        return
+    src = sqlite3.connect(primary.url.database)
+    dst = sqlite3.connect(replica.url.database)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
@@ -1,3 +1,5 @@
+import os
+import tempfile
 from datetime import datetime
 
 def format_currency(value):
@@ -15,4 +17,22 @@ def calculate_yield(current_val, cost_val):
     """计算简单收益率"""
     if cost_val == 0:
         return 0
-    return round(((current_val - cost_val) / cost_val) * 100, 2)
\ No newline at end of file
+    return round(((current_val - cost_val) / cost_val) * 100, 2)
+
+def atomic_write(path, data):
+    """
+    写临时文件后原子替换 path (data 为 bytes)，读取方不会读到半个文件
+    临时文件名由 mkstemp 保证唯一：多个进程 / 线程同时写也不会互相覆盖；写入失败时删除临时文件
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # mkstemp 建出来是 0600，恢复成普通数据文件的权限
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# 这些模块很重，启动阶段不应被导入 (只在定时任务 / OCR 首次使用时加载)
+HEAVY_MODULES = ('akshare', 'pandas', 'thefuzz', 'rapidfuzz')
+
+
+class StartupProfile:
+    """
+    ⏱️ 冷启动分阶段计时 (设置环境变量 STARTUP_PROFILE=1 开启)
+    云托管 minNum=0，缩容到 0 后第一个请求要等容器启动完，用它定位启动慢在哪一步
+    """
+    enabled = bool(os.environ.get('STARTUP_PROFILE'))
+    _phases = []
+
+    @classmethod
+    @contextmanager
+    def phase(cls, name):
+        if not cls.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls._phases.append((name, time.perf_counter() - start))
+
+    @classmethod
+    def record(cls, name, seconds):
+        """记录在 phase() 之外测得的耗时 (例如导入 app 包本身)"""
+        if cls.enabled:
+            cls._phases.append((name, seconds))
+
+    @classmethod
+    def report(cls, started_at, label=''):
+        """started_at 为 time.perf_counter() 起点"""
+        if not cls.enabled:
+            return
+        lines = [f"⏱️ [Startup] {label} pid={os.getpid()} 总耗时 {(time.perf_counter() - started_at) * 1000:.0f}ms"]
+        lines += [f"   - {name}: {cost * 1000:.0f}ms" for name, cost in cls._phases]
+        loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+        lines.append(f"   - 已加载的重模块: {', '.join(loaded) if loaded else '无'}")
+        print("\n".join(lines), flush=True)
+        cls._phases = []
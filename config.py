@@ -23,7 +23,7 @@ class Config:
     # 检查是否存在云托管注入的 MySQL 地址变量
     if os.environ.get('MYSQL_ADDRESS'):
         # --- 云端环境 (MySQL) ---
-        print("🚀 [Config] 检测到云端环境，正在连接 MySQL...")
+        DB_BACKEND = 'mysql'
         
         # 获取环境变量 (这些变量需要在云托管控制台配置)
         mysql_user = os.environ.get('MYSQL_USERNAME', 'root')
@@ -42,17 +42,160 @@ class Config:
             "max_overflow": 20,
             "pool_timeout": 10       # 获取连接等待超时时间
         }
+
+        # 可选：云托管 Redis (未配置时行情缓存只使用进程内缓存)
+        REDIS_URL = os.environ.get('REDIS_URL')
+
+        # 可选：只读从库 (配置后只读接口走从库，写操作与读己之写仍走主库)
+        if os.environ.get('MYSQL_REPLICA_ADDRESS'):
+            SQLALCHEMY_BINDS = {
+                'replica': {
+                    "url": f"mysql+pymysql://{mysql_user}:{mysql_pass}@{os.environ['MYSQL_REPLICA_ADDRESS']}/{mysql_db}?charset=utf8mb4",
+                    **SQLALCHEMY_ENGINE_OPTIONS
+                }
+            }
         
         
     else:
         # --- 本地环境 (SQLite) ---
-        print("🐢 [Config] 检测到本地环境，使用 SQLite 文件")
+        DB_BACKEND = 'sqlite'
         
 
 
         SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'app.db')
+
+        # 本地模拟从库：设置 SQLITE_REPLICA=1 后使用第二个 SQLite 文件，由定时任务从主库复制 (模拟复制延迟)
+        if os.environ.get('SQLITE_REPLICA'):
+            SQLALCHEMY_BINDS = {'replica': 'sqlite:///' + os.path.join(basedir, 'app_replica.db')}
         
         JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=7)
         SQLALCHEMY_TRACK_MODIFICATIONS = False
 
-        REDIS_URL = "redis://localhost:6379/0"
\ No newline at end of file
+        # 可选：本地 Redis (不设置时只使用进程内缓存，避免每个进程反复连接不存在的 localhost:6379)
+        REDIS_URL = os.environ.get('REDIS_URL')
+
+    # =========================================================
+    # 🟢 行情缓存配置
+    # =========================================================
+    # 进程内 LRU 最多缓存多少个基金代码
+    QUOTE_CACHE_SIZE = int(os.environ.get('QUOTE_CACHE_SIZE', 5000))
+    # 交易时段内行情缓存秒数 (天天估值约 1 分钟更新一次)
+    QUOTE_CACHE_TTL_TRADING = int(os.environ.get('QUOTE_CACHE_TTL_TRADING', 30))
+    # 收盘后缓存到下一次开盘，但最长不超过该秒数 (场外基金晚间会更新当日净值)
+    QUOTE_CACHE_TTL_CLOSED_MAX = int(os.environ.get('QUOTE_CACHE_TTL_CLOSED_MAX', 1800))
+    # 交易时段内后台预取所有持仓基金行情的间隔秒数
+    QUOTE_PREFETCH_INTERVAL = int(os.environ.get('QUOTE_PREFETCH_INTERVAL', 30))
+    # 预取快照超过该秒数没有刷新就不再使用 (收盘后 / 预取任务异常)
+    QUOTE_SNAPSHOT_MAX_AGE = int(os.environ.get('QUOTE_SNAPSHOT_MAX_AGE', QUOTE_PREFETCH_INTERVAL * 3))
+    # 最新行情批量写入 fund_quotes 表的间隔秒数 (write-behind)
+    QUOTE_STORE_FLUSH_INTERVAL = int(os.environ.get('QUOTE_STORE_FLUSH_INTERVAL', 15))
+
+    # =========================================================
+    # 🟢 上游 HTTP 连接池配置
+    # =========================================================
+    # 与 Dockerfile 中 gunicorn --threads 保持一致
+    GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 4))
+    # 并发抓取行情的共享线程数 (过大容易被天天基金封 IP)
+    UPSTREAM_EXECUTOR_WORKERS = int(os.environ.get('UPSTREAM_EXECUTOR_WORKERS', 5))
+    # 行情预取 (leader 定时任务) 专用的抓取线程数，与请求路径的线程池分开
+    UPSTREAM_PREFETCH_WORKERS = int(os.environ.get('UPSTREAM_PREFETCH_WORKERS', 5))
+    # 每个 host 的 keep-alive 连接数：请求线程 + 抓取线程同时在用时也不用新建连接
+    UPSTREAM_POOL_SIZE = int(os.environ.get('UPSTREAM_POOL_SIZE',
+                                            GUNICORN_THREADS + UPSTREAM_EXECUTOR_WORKERS + UPSTREAM_PREFETCH_WORKERS))
+    # 各上游的超时 (秒) 与重试次数 (仅对 GET 的连接错误/5xx 重试)
+    UPSTREAM_HOSTS = {
+        'fundgz.1234567.com.cn': {"timeout": 5, "retries": 1},
+        'hq.sinajs.cn': {"timeout": 3, "retries": 1},
+        'api.weixin.qq.com': {"timeout": 5, "retries": 0},
+        'default': {"timeout": 10, "retries": 0},
+    }
+    # 各行情源的限速与熔断：rate/burst 为每秒请求数与突发量，max_concurrency 为自适应并发上限
+    UPSTREAM_SOURCES = {
+        'tiantian': {"rate": 10, "burst": 20, "max_concurrency": UPSTREAM_EXECUTOR_WORKERS,
+                     "failure_threshold": 5, "open_seconds": 60},
+        'sina': {"rate": 5, "burst": 10, "max_concurrency": 2,
+                 "failure_threshold": 3, "open_seconds": 30},
+    }
+    # 预取专用的限速预算 (与请求路径分开计数)：天天基金逐只请求，20/s 约可在一个预取周期 (30s) 内抓完 600 只
+    UPSTREAM_PREFETCH_SOURCES = {
+        'tiantian': {"rate": int(os.environ.get('PREFETCH_TIANTIAN_RATE', 20)), "burst": 20,
+                     "max_concurrency": UPSTREAM_PREFETCH_WORKERS, "failure_threshold": 5, "open_seconds": 60},
+        'sina': {"rate": 5, "burst": 10, "max_concurrency": 2,
+                 "failure_threshold": 3, "open_seconds": 30},
+    }
+
+    # =========================================================
+    # 🟢 SSE 实时估值推送
+    # =========================================================
+    # 每个进程最多同时保持的推送连接数 (每条连接占用一个 gunicorn 线程)
+    SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', max(GUNICORN_THREADS // 2, 1)))
+    # 单次连接最长秒数，到时断开由客户端自动重连
+    SSE_MAX_DURATION = int(os.environ.get('SSE_MAX_DURATION', 120))
+    # 没有行情变化时发送心跳的间隔秒数
+    SSE_KEEPALIVE = int(os.environ.get('SSE_KEEPALIVE', 15))
+    # 客户端断线重连等待毫秒数
+    SSE_RETRY_MS = int(os.environ.get('SSE_RETRY_MS', 3000))
+
+    # =========================================================
+    # 🟢 用户身份缓存
+    # =========================================================
+    # 进程内 openid -> user_id 缓存条数
+    IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE', 10000))
+    # openid -> user_id 缓存秒数 (用户 ID 不会变，只是避免冷用户长期占位)
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 86400))
+
+    # =========================================================
+    # 🟢 用户持仓缓存
+    # =========================================================
+    # 进程内最多缓存多少个用户的持仓
+    HOLDINGS_CACHE_SIZE = int(os.environ.get('HOLDINGS_CACHE_SIZE', 5000))
+    # 持仓缓存秒数：写操作会立即失效 (其他进程通过 Redis 或定时同步的 users.holdings_version 代次号感知)
+    HOLDINGS_CACHE_TTL = int(os.environ.get('HOLDINGS_CACHE_TTL', 30))
+    # 未配置 Redis 时，各进程从 users.holdings_version 同步持仓代次号的间隔秒数 (其他进程最多晚这么久看到变化)
+    USER_GENERATION_SYNC_INTERVAL = int(os.environ.get('USER_GENERATION_SYNC_INTERVAL', 3))
+    # 每次同步回看的秒数 (需大于同步间隔 + 机器间时钟偏差)
+    USER_GENERATION_LOOKBACK = int(os.environ.get('USER_GENERATION_LOOKBACK', 60))
+
+    # =========================================================
+    # 🟢 读写分离
+    # =========================================================
+    # 用户写操作后多少秒内，该用户的只读请求仍走主库 (避开从库复制延迟)
+    DB_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+    # 本地 SQLite 模拟从库的同步间隔秒数
+    DB_REPLICA_SYNC_INTERVAL = int(os.environ.get('DB_REPLICA_SYNC_INTERVAL', 5))
+
+    # =========================================================
+    # 🟢 定时任务 leader 选举
+    # =========================================================
+    # leader 租约有效秒数：leader 进程退出/卡死后，最多这么久由其他进程接管
+    LEADER_LEASE_TTL = int(os.environ.get('LEADER_LEASE_TTL', 30))
+    # 心跳 (续期/抢占) 间隔秒数，需明显小于 LEADER_LEASE_TTL
+    LEADER_HEARTBEAT_INTERVAL = int(os.environ.get('LEADER_HEARTBEAT_INTERVAL', 10))
+    # 非 leader 进程从 fund_quotes 同步 leader 预取行情的间隔秒数
+    QUOTE_SYNC_INTERVAL = int(os.environ.get('QUOTE_SYNC_INTERVAL', 10))
+
+    # =========================================================
+    # 🟢 基金目录发布
+    # =========================================================
+    # 各进程检查已发布基金目录 / 交易日历版本的间隔秒数 (只查版本号，落后时才下载)
+    FUND_CATALOG_SYNC_INTERVAL = int(os.environ.get('FUND_CATALOG_SYNC_INTERVAL', 60))
+
+    # =========================================================
+    # 🟢 OCR 结果缓存
+    # =========================================================
+    # 进程内最多缓存多少张截图的识别结果 (file_id、原始文字块、解析结果各自独立计数)
+    OCR_CACHE_SIZE = int(os.environ.get('OCR_CACHE_SIZE', 500))
+    # 识别结果缓存秒数
+    OCR_CACHE_TTL = int(os.environ.get('OCR_CACHE_TTL', 86400))
+
+    # =========================================================
+    # 🟢 OCR 异步任务
+    # =========================================================
+    # 每个进程执行识别任务的线程数
+    OCR_WORKERS = int(os.environ.get('OCR_WORKERS', 2))
+    # 每个进程最多排队 + 执行中的任务数，超过后提交返回 429
+    OCR_QUEUE_MAX = int(os.environ.get('OCR_QUEUE_MAX', 20))
+    # 超过多少秒仍未结束的任务视为执行进程已退出，标记为失败
+    OCR_JOB_STALE_SECONDS = int(os.environ.get('OCR_JOB_STALE_SECONDS', 300))
+    # 任务记录保留秒数
+    OCR_JOB_RETENTION = int(os.environ.get('OCR_JOB_RETENTION', 86400))
@@ -0,0 +1,21 @@
+# gunicorn.conf.py
+# 冷启动优化：preload_app 让 master 只导入 / 建表一次，worker 直接 fork，不再各自重复初始化
+import os
+
+os.environ.setdefault('GUNICORN_PRELOAD', '1')
+
+bind = '0.0.0.0:80'
+workers = 2
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+
+
+def post_fork(server, worker):
+    from run import app
+    from app import db, start_scheduler
+
+    # master 建表时打开的连接不能被多个 worker 共用，丢弃后由各 worker 自己重新建立
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    start_scheduler()
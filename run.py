@@ -1,18 +1,17 @@
-from app import create_app, db
-from app.models import User, FundAsset, FundGroup # 🟢 显式导入模型，确保建表时能识别到它们
+import os
+import time
 
-app = create_app()
+_started_at = time.perf_counter()
+from app import create_app
+from app.utils.startup import StartupProfile
+StartupProfile.record('import app', time.perf_counter() - _started_at)
 
-# 🟢 关键修改：利用应用上下文自动建表
-# 每次容器启动时，这段代码都会执行，自动检测并创建缺失的表
-with app.app_context():
-    try:
-        db.create_all()
-        print("✅ 数据库表结构同步完成")
-    except Exception as e:
-        print(f"⚠️ 建表失败 (可能是数据库连接问题): {e}")
+# 建表 / 结构检查在 create_app 里只做一次，这里不再重复 create_all
+# gunicorn 使用 gunicorn.conf.py (preload_app) 启动时，定时任务等到 fork 之后再在 worker 里启动
+app = create_app(start_jobs=not os.environ.get('GUNICORN_PRELOAD'))
+StartupProfile.report(_started_at, f"db={app.config['DB_BACKEND']}")
 
 # 下面这部分只在本地开发 ('python run.py') 时生效
 # 云托管上是用 Gunicorn 启动的，不会走这里，所以不用删
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', debug=True, port=5000)
\ No newline at end of file
+    app.run(host='0.0.0.0', debug=True, port=5000)
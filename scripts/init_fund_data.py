@@ -1,7 +1,12 @@
 # scripts/init_fund_data.py
 import akshare as ak
-import json
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import create_app
+from app.services.catalog_release import CatalogRelease
 
 def generate_fund_map():
     print("正在拉取全量基金数据 (可能需要几十秒)...")
@@ -14,14 +19,13 @@ def generate_fund_map():
         # 注意：这里我们做一个反向映射，方便用名字查代码
         fund_map = dict(zip(df['基金简称'], df['基金代码']))
         
-        # 保存为 JSON 文件到 app/data 目录
-        save_path = os.path.join(os.path.dirname(__file__), '../app/data/funds.json')
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        
-        with open(save_path, 'w', encoding='utf-8') as f:
-            json.dump(fund_map, f, ensure_ascii=False)
-            
-        print(f"成功保存 {len(fund_map)} 条基金数据到 {save_path}")
+        # 发布新版本：原子替换 app/data 下的 funds.json / funds.catalog (OCR 匹配时各 worker 以 mmap 共享)，
+        # 并写入数据库，其他实例的 sync_catalog_job 会自动同步
+        app = create_app(start_jobs=False)
+        with app.app_context():
+            version = CatalogRelease.publish(fund_map)
+
+        print(f"成功发布 {len(fund_map)} 条基金数据 (版本 {version})")
         
     except Exception as e:
         print(f"获取失败: {e}")
@@ -0,0 +1,73 @@
+# scripts/migrate_group_ids.py
+# 把 fund_assets.group_name (分组名文本) 迁移为 fund_assets.group_id (引用 fund_groups.id)
+# 用法：python scripts/migrate_group_ids.py   (可重复执行，已迁移时直接退出)
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import inspect, text
+from app import create_app, db
+from app.models import FundAsset, FundGroup
+
+DEFAULT_GROUP_NAME = '默认账户'
+
+
+def ensure_groups(conn):
+    """旧数据里出现过、但 fund_groups 里没有的分组名补建出来"""
+    missing = conn.execute(text(
+        "SELECT DISTINCT a.user_id, a.group_name FROM fund_assets a "
+        "LEFT JOIN fund_groups g ON g.user_id = a.user_id AND g.name = a.group_name "
+        "WHERE g.id IS NULL AND a.user_id IS NOT NULL"
+    )).fetchall()
+    for user_id, name in missing:
+        conn.execute(FundGroup.__table__.insert().values(
+            user_id=user_id, name=name, sort_order=0 if name == DEFAULT_GROUP_NAME else 99
+        ))
+    print(f"补建分组 {len(missing)} 个")
+
+
+def strip_backup(conn, backup):
+    """备份表改名后仍占用原来的索引名 (SQLite) / 外键名 (MySQL)，先删掉，避免与新表冲突"""
+    insp = inspect(conn)
+    if conn.dialect.name == 'mysql':
+        for fk in insp.get_foreign_keys(backup):
+            if fk.get('name'):
+                conn.execute(text(f"ALTER TABLE {backup} DROP FOREIGN KEY {fk['name']}"))
+    else:
+        for index in insp.get_indexes(backup):
+            conn.execute(text(f"DROP INDEX IF EXISTS {index['name']}"))
+
+
+def migrate():
+    app = create_app(start_jobs=False)
+    with app.app_context():
+        columns = {c['name'] for c in inspect(db.engine).get_columns('fund_assets')}
+        if 'group_id' in columns:
+            print("✅ fund_assets 已是 group_id 结构，无需迁移")
+            return
+
+        backup = f"fund_assets_bak_{int(time.time())}"
+        # 新表有而旧表也有的列原样复制，group_id 通过分组名关联得到
+        copy_cols = [c.name for c in FundAsset.__table__.columns if c.name in columns and c.name != 'group_id']
+
+        with db.engine.begin() as conn:
+            ensure_groups(conn)
+        with db.engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE fund_assets RENAME TO {backup}"))
+            strip_backup(conn, backup)
+        FundAsset.__table__.create(db.engine)
+        with db.engine.begin() as conn:
+            cols = ", ".join(copy_cols)
+            src_cols = ", ".join(f"a.{c}" for c in copy_cols)
+            moved = conn.execute(text(
+                f"INSERT INTO fund_assets ({cols}, group_id) "
+                f"SELECT {src_cols}, g.id FROM {backup} a "
+                f"JOIN fund_groups g ON g.user_id = a.user_id AND g.name = a.group_name"
+            )).rowcount
+        print(f"✅ 迁移完成：{moved} 条持仓，旧表保留为 {backup}，确认无误后可手动删除")
+
+
+if __name__ == '__main__':
+    migrate()